@@ -36,7 +36,8 @@ public class AppController {
     public SseEmitter searchWithAgents(
         @RequestParam String artistName,
             @RequestParam String context,
-            @RequestParam(required=false) String artworkTitle
+            @RequestParam(required=false) String artworkTitle,
+            @RequestParam(required=false) Double latencyBudgetSeconds
     ) {
         System.out.println(pythonServiceUrl);
         final boolean artworkTitleExists = artworkTitle != null && !artworkTitle.isBlank();
@@ -61,6 +62,9 @@ public class AppController {
                 if (artworkTitleExists){
                     pythonServiceRequest.put("artworkTitle", artworkTitle);
                 }
+                if (latencyBudgetSeconds != null){
+                    pythonServiceRequest.put("latencyBudgetSeconds", latencyBudgetSeconds);
+                }
 
                 String llmServiceURL = pythonServiceUrl + "/agent";
                 System.out.println("Calling Python service at: " + llmServiceURL);
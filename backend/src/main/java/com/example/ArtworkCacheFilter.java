@@ -164,10 +164,11 @@ public class ArtworkCacheFilter extends OncePerRequestFilter {
                         // Get last message that was sent in body - this will contain the final JSON 
                         // response and an additional :flush message
                         int lastDataStart = body.lastIndexOf("data:{\"status\": \"complete\",");
-                        if(lastDataStart >= 0){
+                        // Partial results (cut short by a latency budget) are not cached
+                        if(lastDataStart >= 0 && !body.substring(lastDataStart).contains("\"partial\": true")){
                             String lastMessage = body.substring(lastDataStart);
                             int[] t = isArtworkRequest(request) ? ttlsForAgent()
-                                                                : ttlsForArtworkScope(Optional.ofNullable(request.getParameter("scope")).orElse("political-events"));
+                                                                : ttlsForArtworkScope(Optional.ofNullable(request.getParameter("context")).orElse("political-events"));
                             httpCache.put(key, lastMessage, t[0], t[1]);
                             System.out.println("Filter: added last message to " + key);
                         }
@@ -0,0 +1,222 @@
+# Persistent index of the timeline events parsed for every artist
+# Political and economic events (e.g. the Mexican Revolution or the 1929 crash) come up again
+# for many artists from the same era and place, so parsed events are indexed by scope,
+# normalized title, year range and location, and looked up by overlapping year ranges
+# Researcher runs for an artist whose lifetime is known are seeded with the events already
+# indexed for that period, so they only need to search for (and write up) what is missing
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import result_store
+
+DEFAULT_INDEX_PATH = os.getenv(
+    "EVENT_INDEX_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "event_index.db")
+)
+# scopes whose events are shared between artists (personal events and the like are not)
+SHARED_EVENT_SCOPES = {"political-events", "economic-events"}
+# scope whose events are used to work out an artist's lifetime, when it isn't given explicitly
+LIFETIME_SCOPE = "personal-events"
+# maximum number of known events included when seeding a researcher
+MAX_SEED_EVENTS = 12
+# longest lifetime inferred for an artist whose personal events don't include their death
+MAX_LIFESPAN_YEARS = 90
+
+year_re = re.compile(r"(\d{4})(s?)")
+death_re = re.compile(r"\b(death|dies|died|passes away|passed away)\b", re.IGNORECASE)
+
+# parses a year range out of an event date such as "1929-1939", "1927", "Circa 1890s" or
+# "1910–1920", returning (start, end) or None if the date contains no year
+def parse_years(date):
+    if date is None:
+        return None
+    years = []
+    for year, decade in year_re.findall(str(date)):
+        years.append(int(year))
+        if decade:
+            years.append(int(year) + 9)
+    if not years:
+        return None
+    return min(years), max(years)
+
+# Works out an artist's lifetime (start, end) from the year ranges and titles of their personal
+# events, which may include posthumous ones (retrospectives, museum openings, ...): it runs from
+# the earliest event to the latest one whose title is about a death, or if there is none, to the
+# latest event within MAX_LIFESPAN_YEARS of the earliest one; None if no event has a year
+def infer_lifetime(dated_events):
+    if not dated_events:
+        return None
+    start = min(years[0] for years, title in dated_events)
+    deaths = [years[0] for years, title in dated_events if death_re.search(title)]
+    if deaths:
+        return start, max(deaths)
+    last = start + MAX_LIFESPAN_YEARS
+    return start, min(last, max(years[1] for years, title in dated_events if years[0] <= last))
+
+def normalize_title(title):
+    title = re.sub(r"[^\w\s]", " ", title.lower())
+    title = re.sub(r"^the\s+", "", title.strip())
+    return " ".join(title.split())
+
+def normalize_location(location):
+    return " ".join((location or "").lower().split())
+
+class EventIndex:
+    def __init__(self, db_path = DEFAULT_INDEX_PATH):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.initialized = False
+
+    # the database is opened (and its tables created) on first use rather than on import, so
+    # importing the service stays cheap; callers hold self.lock
+    def _connect(self):
+        c = sqlite3.connect(self.db_path, timeout=30)
+        if not self.initialized:
+            with c:
+                self._init(c)
+            self.initialized = True
+        return c
+
+    def _init(self, c):
+        c.execute("PRAGMA journal_mode=WAL")
+        c.execute("""
+          CREATE TABLE IF NOT EXISTS events(
+            id INTEGER PRIMARY KEY,
+            scope TEXT NOT NULL,
+            norm_title TEXT NOT NULL,
+            start_year INTEGER NOT NULL,
+            end_year INTEGER NOT NULL,
+            location TEXT NOT NULL,
+            event TEXT NOT NULL,
+            updated_at INTEGER NOT NULL,
+            UNIQUE(scope, norm_title, start_year, location)
+          )
+        """)
+        c.execute("""
+          CREATE TABLE IF NOT EXISTS artist_events(
+            event_id INTEGER NOT NULL,
+            artist TEXT NOT NULL,
+            PRIMARY KEY(event_id, artist)
+          )
+        """)
+        c.execute("""
+          CREATE TABLE IF NOT EXISTS artists(
+            artist TEXT PRIMARY KEY,
+            start_year INTEGER NOT NULL,
+            end_year INTEGER NOT NULL,
+            explicit INTEGER NOT NULL
+          )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_events_interval ON events(scope, start_year, end_year)")
+
+    #### Updates
+    # adds an artist's parsed events for a scope to the index, recording which artist they came
+    # from; personal events also extend the artist's known lifetime (see infer_lifetime())
+    def add_events(self, scope, artist_name, event_list):
+        artist = result_store.slug(artist_name)
+        now = int(time.time())
+        dated_events = []
+        with self.lock, self._connect() as c:
+            for event in event_list:
+                years = parse_years(event.get("date"))
+                title = normalize_title(event.get("event_title", ""))
+                if years is None or not title:
+                    continue
+                dated_events.append((years, title))
+                if scope not in SHARED_EVENT_SCOPES:
+                    continue
+                stored = {key: event.get(key) for key in ("date", "event_title", "location_name", "latitude", "longitude", "source_url")}
+                location = normalize_location(event.get("location_name"))
+                c.execute("""
+                  INSERT INTO events(scope, norm_title, start_year, end_year, location, event, updated_at)
+                  VALUES(?,?,?,?,?,?,?)
+                  ON CONFLICT(scope, norm_title, start_year, location) DO UPDATE SET
+                    end_year=MAX(end_year, excluded.end_year),
+                    updated_at=excluded.updated_at
+                """, (scope, title, years[0], years[1], location, json.dumps(stored), now))
+                event_id = c.execute(
+                    "SELECT id FROM events WHERE scope=? AND norm_title=? AND start_year=? AND location=?",
+                    (scope, title, years[0], location)
+                ).fetchone()[0]
+                c.execute("INSERT OR IGNORE INTO artist_events(event_id, artist) VALUES(?,?)", (event_id, artist))
+            lifetime = infer_lifetime(dated_events) if scope == LIFETIME_SCOPE else None
+            if lifetime is not None:
+                self._extend_span(c, artist, *lifetime)
+
+    def _extend_span(self, c, artist, start_year, end_year):
+        c.execute("""
+          INSERT INTO artists(artist, start_year, end_year, explicit) VALUES(?,?,?,0)
+          ON CONFLICT(artist) DO UPDATE SET
+            start_year=MIN(start_year, excluded.start_year),
+            end_year=MAX(end_year, excluded.end_year)
+          WHERE explicit=0
+        """, (artist, start_year, end_year))
+
+    # records an artist's lifetime as given (e.g. from the precompute job's input), which takes
+    # precedence over the lifetime inferred from their personal events
+    def set_artist_span(self, artist_name, start_year, end_year):
+        with self.lock, self._connect() as c:
+            c.execute("""
+              INSERT INTO artists(artist, start_year, end_year, explicit) VALUES(?,?,?,1)
+              ON CONFLICT(artist) DO UPDATE SET
+                start_year=excluded.start_year, end_year=excluded.end_year, explicit=1
+            """, (result_store.slug(artist_name), start_year, end_year))
+
+    #### Queries
+    def artist_span(self, artist_name):
+        with self.lock, self._connect() as c:
+            row = c.execute("SELECT start_year, end_year FROM artists WHERE artist=?", (result_store.slug(artist_name),)).fetchone()
+        return tuple(row) if row else None
+
+    # events of a scope whose year range overlaps [start_year, end_year], optionally only those
+    # whose location contains `location` and/or that aren't already in an artist's timeline;
+    # events shared by the most artists come first
+    def lookup(self, scope, start_year, end_year, location = None, exclude_artist = None, limit = 50):
+        query = """
+          SELECT e.event, e.start_year, e.end_year, COUNT(a.artist) AS artist_count
+          FROM events e LEFT JOIN artist_events a ON a.event_id = e.id
+          WHERE e.scope=? AND e.start_year<=? AND e.end_year>=?
+        """
+        params = [scope, end_year, start_year]
+        if location:
+            query += " AND e.location LIKE ?"
+            params.append("%" + normalize_location(location) + "%")
+        if exclude_artist:
+            query += " AND e.id NOT IN (SELECT event_id FROM artist_events WHERE artist=?)"
+            params.append(result_store.slug(exclude_artist))
+        query += " GROUP BY e.id ORDER BY artist_count DESC, e.start_year LIMIT ?"
+        params.append(limit)
+        with self.lock, self._connect() as c:
+            rows = c.execute(query, params).fetchall()
+        results = []
+        for event_json, start, end, artist_count in rows:
+            event = json.loads(event_json)
+            event["start_year"], event["end_year"], event["artist_count"] = start, end, artist_count
+            results.append(event)
+        return results
+
+    # known events for the artist's lifetime formatted to be appended to a researcher's task,
+    # or "" if the scope isn't shared, the artist's lifetime is unknown or nothing is indexed
+    def seed_notes(self, scope, artist_name, max_events = MAX_SEED_EVENTS):
+        if scope not in SHARED_EVENT_SCOPES:
+            return ""
+        span = self.artist_span(artist_name)
+        if span is None:
+            return ""
+        known = self.lookup(scope, span[0], span[1], exclude_artist=artist_name, limit=max_events)
+        if not known:
+            return ""
+        notes = (f"Events already known from other artists' timelines for {span[0]}-{span[1]} (include the ones "
+                 f"relevant to {artist_name} with an explanation of their relevance, and only search for events "
+                 "that are still missing):\n")
+        for number, event in enumerate(known, start=1):
+            notes += (f"{number}. Year(s): {event['date']}; Event Title: {event['event_title']}; "
+                      f"Location: {event['location_name']}; Source: {event['source_url']}\n")
+        return notes
+
+# shared by every request and worker in the process
+event_index = EventIndex()
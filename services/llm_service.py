@@ -1,16 +1,27 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 
 from dotenv import load_dotenv
 import os
 import json
-import openai
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pydantic import BaseModel
 from typing import Optional
-from huggingface_hub import login
-from smolagents import ToolCallingAgent, OpenAIServerModel, PythonInterpreterTool
 # for images:
 import llm_service_helpers as helpers
+import rate_limits
+from research_context import research_contexts, SHARED_SCOPES
+from network_graph import network_graph
+from event_index import event_index
+import result_store
+from prompt_registry import prompt_registry
+
+# NOTE: openai, huggingface_hub and smolagents are heavy to import (and the HF login makes a
+# network call), so they are only imported inside warm_up() below rather than at module level;
+# this keeps the app's import (and therefore the "/" liveness check) fast on cold starts
 
 ### Initialize FastAPI app ###
 app = FastAPI()
@@ -19,11 +30,9 @@ app = FastAPI()
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY: raise ValueError("Missing or incorrect OpenAI API Key.")
-openAIClient = openai.OpenAI(api_key=OPENAI_API_KEY)
 
 HF_API_TOKEN = os.getenv("HF_API_TOKEN")
 if not HF_API_TOKEN: raise ValueError("Missing or incorrect HF API Token.")
-HFlogin = login(token=HF_API_TOKEN)
 
 # for google programmable search engine - images
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -32,12 +41,6 @@ GOOGLE_CSE_ID = os.getenv("GOOGLE_CSE_ID")
 if not GOOGLE_API_KEY or not GOOGLE_CSE_ID:
     print("Error: GOOGLE_API_KEY or GOOGLE_CSE_ID not found in .env file. Image search will be disabled.")
 
-openAIModel = OpenAIServerModel(
-    model_id = "gpt-4o-mini",
-    api_base = "https://api.openai.com/v1",
-    api_key = OPENAI_API_KEY
-)
-
 ### Set up for handling different scopes ###
 
 # Mapping each scope (as requested via calls to the API) to:
@@ -48,95 +51,72 @@ openAIModel = OpenAIServerModel(
 #   b) the type of output the scope is expected to return, either "event" for timeline events or "network" for
 #      artist network data - this determines which parser is used to parse the output
 #   c) the human-readable version of the scope to be printed in error messages, logging messages, etc.
-# An additional "prompt_files" key will be filled below after loading the actual files, being empty if an error 
-# occurred while loading the files
+#   d) optionally, the prompt lists ("prompts"/"artwork_prompts") whose first prompt doesn't produce output in
+#      the final format (e.g. just the name of a genre), so the later prompts can't be skipped to meet a deadline
+# The prompt texts themselves are looked up in the prompt registry (see prompt_registry.py), which picks up
+# changes to the files without a restart
 scope_info = {
     "political-events": {
         "prompts": ["researcher_prompt"],
         "artwork_prompts": ["researcher_artwork_prompt"],
-        "prompt_files": [],
-        "artwork_prompt_files": [],
         "output_parse_type": "event",
         "name": "Political / historical"
     },
     "artist-network": {
         "prompts": ["researcher_network_prompt", "historian_network_prompt"],
         "artwork_prompts": [], # artwork title not supported for this scope
-        "prompt_files": [],
-        "artwork_prompt_files": [],
         "output_parse_type": "network",
         "name": "Artist network"
     },
     "art-movements": {
         "prompts": ["researcher_art_movements_prompt"],
         "artwork_prompts": ["researcher_artwork_art_movements_prompt", "historian_art_movements_prompt"],
-        "prompt_files": [],
-        "artwork_prompt_files": [],
         "output_parse_type": "event",
-        "name": "Art movement"
+        "name": "Art movement",
+        "intermediate_output": ["artwork_prompts"]
     },
     "personal-events": {
         "prompts": ["researcher_personal_events_prompt"],
         "artwork_prompts": ["researcher_artwork_personal_events_prompt"],
-        "prompt_files": [],
-        "artwork_prompt_files": [],
         "output_parse_type": "event",
         "name": "Personal event"
     },
     "economic-events": {
         "prompts": ["researcher_economic_events_prompt"],
         "artwork_prompts": ["researcher_artwork_economic_events_prompt"],
-        "prompt_files": [],
-        "artwork_prompt_files": [],
         "output_parse_type": "event",
         "name": "Economic event"
     },
     "genre": {
         "prompts": ["researcher_genre_prompt", "historian_genre_prompt"],
         "artwork_prompts": ["researcher_artwork_genre_prompt", "historian_genre_prompt"],
-        "prompt_files": [],
-        "artwork_prompt_files": [],
         "output_parse_type": "event",
-        "name": "Genre"
+        "name": "Genre",
+        "intermediate_output": ["prompts", "artwork_prompts"]
     },
     "medium": {
         "prompts": ["researcher_medium_prompt", "historian_medium_prompt"],
         "artwork_prompts": ["researcher_artwork_medium_prompt", "historian_medium_prompt"],
-        "prompt_files": [],
-        "artwork_prompt_files": [],
         "output_parse_type": "event",
-        "name": "Medium"
+        "name": "Medium",
+        "intermediate_output": ["prompts", "artwork_prompts"]
     },
     # will never be called in an API request, but used as a fallback if an unrecognized scope is requested
     "default": {
         "prompts": ["researcher_prompt"],
         "artwork_prompts": ["researcher_artwork_prompt"],
-        "prompt_files": [],
-        "artwork_prompt_files": [],
         "output_parse_type": "event",
         "name": "Political / historical (DEFAULT)"
     }
 }
 
-# Helper to load a list of files into a target_key in the scope info structure
-# given a list of the file names in info[source_key]
-def load_prompt_files(info: dict[str, any], target_key: str, source_key: str):
-    try:
-        # loop through all prompt names and try to open their corresponding files, 
-        # appending them to the prompt_files list in scope info
-        for prompt in info[source_key]:
-            newFile = open(prompt + ".txt", "r", encoding="utf-8").read()
-            info[target_key].append(newFile) 
-    except FileNotFoundError:
-        # on error, set prompt_files to empty list and print warning
-        info[target_key] = []
-        prompt_name = info["name"]
-        print("Warning: " + prompt_name + " prompt files (for: " + target_key + ") not found. " + prompt_name + " scope may not function correctly.")
-
-# loading the corresponding prompt files for each scope
+# warn about scopes whose prompt files are missing (those scopes fall back to the default prompts)
 for scope, info in scope_info.items():
-    load_prompt_files(info, "prompt_files", "prompts")
-    load_prompt_files(info, "artwork_prompt_files", "artwork_prompts")
+    for prompts_key in ("prompts", "artwork_prompts"):
+        missing = [name for name in info[prompts_key] if prompt_registry.current().get(name) is None]
+        if missing:
+            print("Warning: " + info["name"] + " prompt files (for: " + prompts_key + ") not found: " + ", ".join(missing)
+                  + ". " + info["name"] + " scope may not function correctly.")
 
 ### Set up for parsing different scope output types ###
 
@@ -201,20 +181,113 @@ output_types = {
 
 ### Set up for agents ###
 
-# construct rate-limited search tool and agents to be used across scopes
-rate_limited_search_tool = helpers.RateLimitedSearchTool()
-agents = [
-    ToolCallingAgent(
-        tools=[rate_limited_search_tool, PythonInterpreterTool()],
-        model=openAIModel,
-        max_steps=6
-    ), # researcher
-    ToolCallingAgent(
-        tools=[PythonInterpreterTool()],
-        model=openAIModel,
-        max_steps=4
-    ) # historian
-]
+# The clients, model and default agent set below are created lazily by warm_up(), which is
+# started in a background thread when the app starts up (see the startup hook further below)
+# and is also called by any request that arrives before the warm-up has finished
+openAIClient = None
+openAIModel = None
+default_agent_set = None
+# agents keep per-run state, so the default agent set runs one request at a time
+default_agent_set_lock = threading.Lock()
+
+# readiness state of the lazily-loaded dependencies, reported by the /ready endpoint
+warm_up_lock = threading.Lock()
+warm_up_state = {"ready": False, "error": None}
+
+# Imports the heavy dependencies and constructs the clients and the default agent set used
+# across scopes, doing nothing if this has already happened; safe to call from several threads
+def warm_up():
+    global openAIClient, openAIModel, default_agent_set
+    with warm_up_lock:
+        if warm_up_state["ready"]:
+            return
+        try:
+            import openai
+            from huggingface_hub import login
+            import llm_service_tools as tools
+
+            openAIClient = openai.OpenAI(api_key=OPENAI_API_KEY)
+            login(token=HF_API_TOKEN)
+
+            # all agents share this model, whose calls go through the process-wide OpenAI limits
+            openAIModel = tools.GovernedOpenAIServerModel(
+                model_id = "gpt-4o-mini",
+                api_base = "https://api.openai.com/v1",
+                api_key = OPENAI_API_KEY
+            )
+            default_agent_set = build_agent_set()
+            warm_up_state["ready"] = True
+            warm_up_state["error"] = None
+            print("Warm-up complete: agents are ready")
+        except Exception as e:
+            # leave the service unready (but alive); the warm-up thread retries (see start_warm_up),
+            # as does the next request
+            warm_up_state["error"] = str(e)
+            print(f"Error during warm-up: {e}")
+            raise
+
+# Construct a rate-limited search tool and the list of agents that the prompts of a scope are
+# run on (in order), plus running usage totals for them
+# Agents keep per-run state, so code running scopes concurrently (e.g. the precompute job)
+# must build one agent set per worker instead of sharing the default one
+def build_agent_set():
+    from smolagents import ToolCallingAgent, PythonInterpreterTool
+    import llm_service_tools as tools
+
+    rate_limited_search_tool = tools.RateLimitedSearchTool()
+    return {
+        "search_tool": rate_limited_search_tool,
+        "agents": [
+            ToolCallingAgent(
+                tools=[rate_limited_search_tool, PythonInterpreterTool()],
+                model=openAIModel,
+                max_steps=6
+            ), # researcher
+            ToolCallingAgent(
+                tools=[PythonInterpreterTool()],
+                model=openAIModel,
+                max_steps=4
+            ) # historian
+        ],
+        "usage": {"agent_runs": 0, "searches": 0, "input_tokens": 0, "output_tokens": 0}
+    }
+
+# Per-thread agent sets for worker pools (the batch endpoint and the precompute job), created
+# on first use in each thread; every one created is also kept in worker_agent_sets for usage totals
+worker_agents = threading.local()
+worker_agent_sets = []
+worker_agent_sets_lock = threading.Lock()
+
+def worker_agent_set():
+    warm_up()
+    if not hasattr(worker_agents, "agent_set"):
+        worker_agents.agent_set = build_agent_set()
+        with worker_agent_sets_lock:
+            worker_agent_sets.append(worker_agents.agent_set)
+    return worker_agents.agent_set
+
+# Start warming up in the background as soon as the server starts, so that the first request
+# does not pay for the imports/login while the liveness check keeps responding immediately
+# A failed warm-up (e.g. a network error during the Hugging Face login) is retried with a growing
+# delay until it succeeds, since an unready instance gets no requests that could retry it
+WARM_UP_RETRY_SECONDS = float(os.getenv("WARM_UP_RETRY_SECONDS", 5))
+WARM_UP_MAX_RETRY_SECONDS = 300
+
+@app.on_event("startup")
+def start_warm_up():
+    def run_warm_up():
+        delay = WARM_UP_RETRY_SECONDS
+        while not warm_up_state["ready"]:
+            try:
+                warm_up()
+            except Exception:
+                # already logged and recorded in warm_up_state
+                print(f"Retrying warm-up in {delay:g}s")
+                time.sleep(delay)
+                delay = min(delay * 2, WARM_UP_MAX_RETRY_SECONDS)
+    threading.Thread(target=run_warm_up, name="llm-service-warm-up", daemon=True).start()
+    # pick up edited prompt files without a restart
+    prompt_registry.start_watching()
 
 ### Request Format Class ###
 
@@ -222,43 +295,133 @@ class AgentsRequest(BaseModel):
     artistName: str
     artworkTitle: Optional[str] = None
     context: list
+    # optional time budget for the whole request; when it runs low, agent steps are cut short
+    # and a partial result (flagged with "partial": true in the payload) is returned
+    latencyBudgetSeconds: Optional[float] = None
+
+### Latency budget ###
+
+# rough duration of a single agent step (a model call plus any tool call), used to work out how
+# many steps fit into the time left before a request's deadline
+AGENT_STEP_SECONDS = 10
+# time kept back for each later prompt (e.g. the historian) while the researcher is running
+LATER_PROMPT_RESERVE_SECONDS = 20
 
 ### Main Logic for Endpoint ###
 
 # Main function to run agents given a specific query string and the name of the key
-# in scope_info containing the prompt files to run
+# in scope_info listing the prompts to run (looked up in the current prompt registry snapshot, so
+# a reload halfway through never mixes prompt versions within a run), optionally on a specific agent set
+# (defaulting to the shared one built during warm-up) and before a deadline (a time.monotonic()
+# timestamp, after which remaining agent steps are cut short or skipped)
+# If given an artist's research context, the researcher reuses and adds to the research in it,
+# and any seed notes (e.g. known events for the artist's lifetime) are added to its task
 # Returns the resultsas well as the type that it should be parsed as (handing it off to
-# calling code to process it accordingly)
-def query_agents(scope: str, query: str, prompt_files_key: str):
-    # reset rate-limited search tool on each run
-    rate_limited_search_tool.reset()
+# calling code to process it accordingly), and whether the result is partial because of the deadline
+def query_agents(scope: str, query: str, prompts_key: str, agent_set: Optional[dict] = None,
+                 deadline: Optional[float] = None, research_context = None, seed_notes: str = ""):
+    # make sure the agents exist (blocks until the background warm-up is done if it is running)
+    warm_up()
+    if agent_set is None:
+        with default_agent_set_lock:
+            return query_agents(scope, query, prompts_key, default_agent_set, deadline, research_context, seed_notes)
 
     # attempt to find target scope - falling back to default if unrecognized
+    snapshot = prompt_registry.current()
     target_scope = scope 
-    if scope not in scope_info or len(scope_info[target_scope][prompt_files_key]) == 0:
+    if scope not in scope_info or len(snapshot.prompts(scope_info[target_scope][prompts_key])) == 0:
         target_scope = "default" 
         print(f"Warning: Scope '{scope}' not explicitly handled. Using default prompt(s).")
-            
+    prompts = snapshot.prompts(scope_info[target_scope][prompts_key])
+
+    # each prompt has to finish early enough to leave time for the ones after it
+    def prompt_deadline(index):
+        if deadline is None:
+            return None
+        return deadline - LATER_PROMPT_RESERVE_SECONDS * (len(prompts) - index - 1)
+
+    # reset rate-limited search tool on each run (it is only used by the first agent), and don't
+    # let the model calls made on this thread wait for a turn past the deadline either
+    import llm_service_tools as tools
+    search_tool = agent_set["search_tool"]
+    search_tool.reset(prompt_deadline(0), research_context)
+    tools.set_request_deadline(deadline)
+
     # run agents on as many prompts as is specified (some scopes have 1, some scopes have 2),
-    # passing in the result from the previous step
+    # passing in the result from the previous step; the researcher also gets the seed notes and
+    # any research already gathered for the artist by other scopes
     result = query
-    for index, prompt in enumerate(scope_info[target_scope][prompt_files_key]):
+    if seed_notes:
+        result += "\n\n" + seed_notes
+    if research_context is not None:
+        notes = research_context.notes()
+        if notes:
+            result += "\n\n" + notes
+    partial = False
+    usage = agent_set["usage"]
+    intermediate_output = prompts_key in scope_info[target_scope].get("intermediate_output", [])
+    for index, prompt in enumerate(prompts):
+        current_agent = agent_set["agents"][index]
+        max_steps = current_agent.max_steps
+        if deadline is not None:
+            time_left = prompt_deadline(index) - time.monotonic()
+            # the first agent always runs so there is something to return; later ones are
+            # skipped if not even a single step fits in the time left, unless the result so far
+            # isn't in the final format, in which case they get a single step (and their model
+            # calls an extra AGENT_STEP_SECONDS past the deadline to get a turn)
+            if index > 0 and time_left < AGENT_STEP_SECONDS:
+                partial = True
+                if not intermediate_output:
+                    print(f"Latency budget running low, skipping prompt #{index + 1} for scope {target_scope}")
+                    break
+                print(f"Latency budget running low, running prompt #{index + 1} for scope {target_scope} for a single step")
+                tools.extend_request_deadline(time.monotonic() + AGENT_STEP_SECONDS)
+            max_steps = min(max_steps, max(1, int(time_left // AGENT_STEP_SECONDS)))
+
         print(f"Running agent with prompt #{index + 1} for scope {target_scope}")
-        current_agent = agents[index]
         current_agent.prompt_templates["system_prompt"] = prompt
-        result = current_agent.run(result)
+        try:
+            result = current_agent.run(result, max_steps=max_steps)
+        except Exception:
+            # a model call that couldn't get a turn before the deadline ends the run; the previous
+            # agent's result is returned as a partial one if there is one
+            if index == 0 or not tools.request_deadline_hit():
+                raise
+            print(f"Latency budget ran out during prompt #{index + 1} for scope {target_scope}")
+            partial = True
+            break
+
+        # the result is partial if the agent ran out of a shortened step allowance before giving
+        # its final answer
+        if max_steps < current_agent.max_steps and tools.hit_step_limit(current_agent):
+            partial = True
+
+        # keep track of usage (token counts are reset by the agent at the start of each run)
+        token_counts = current_agent.monitor.get_total_token_counts()
+        usage["agent_runs"] += 1
+        usage["input_tokens"] += token_counts.input_tokens
+        usage["output_tokens"] += token_counts.output_tokens
+    usage["searches"] += search_tool.call_count
+    partial = partial or search_tool.deadline_hit or tools.request_deadline_hit()
     
     # return output type and result string
-    return result, scope_info[target_scope]["output_parse_type"]
+    return result, scope_info[target_scope]["output_parse_type"], partial
 
 # Helper function to parse a result string with a given parse type, raising a runtime error
 # if the parsed result is not valid or if the parser type is unrecognized, and returning the 
 # results otherwise
-def parse_into_list(result_str: str, output_type: str):
+# For partial results (e.g. the researcher's output when the historian was skipped), invalid
+# entries are dropped instead, and an error is only raised if no valid entries are left
+def parse_into_list(result_str: str, output_type: str, partial: bool = False):
     if output_type not in output_types:
         raise RuntimeError("No corresponding parser for this output type")
     parser = output_types[output_type]["parser"]
     parsed_list = parser.parse(result_str)
+    if partial:
+        parsed_list = [obj for obj in parsed_list if parser.validate_parsed([obj])[0]]
+        if len(parsed_list) == 0:
+            raise RuntimeError("Latency budget ran out before a parseable result was produced")
+        return parsed_list
     is_valid, error_message = parser.validate_parsed(parsed_list)
     if not is_valid:
         raise RuntimeError("Error parsing AI response for data (" + error_message + ")")
@@ -267,9 +430,11 @@ def parse_into_list(result_str: str, output_type: str):
 # Helper function to additionally process an event list by searching for artworks referenced
 # This only occurs for the first appearance of any artwork in an event; if an artwork
 # is referenced by more than one event, we only assign it to the first event
-# within an event; modifies the event list in-place so doesn't return it
-def find_artworks_for_events(event_list: list[dict[str, any]], artist_name: str):
+# within an event; modifies the event list in-place and returns whether any image searches
+# were skipped because the deadline (if given) had passed
+def find_artworks_for_events(event_list: list[dict[str, any]], artist_name: str, deadline: Optional[float] = None):
     artwork_title_set = set()
+    skipped = False
     for event in event_list:
         if "related_artwork" in event:
             artwork_title = event["related_artwork"]
@@ -277,21 +442,164 @@ def find_artworks_for_events(event_list: list[dict[str, any]], artist_name: str)
             if len(artwork_title) > 0 and artwork_title != "<none>":
                 # only process first occurrence of an artwork in an event
                 if artwork_title not in artwork_title_set:
-                    image_url = helpers.get_artwork_image(artwork_title, artist_name, GOOGLE_API_KEY, GOOGLE_CSE_ID)
+                    if deadline is not None and time.monotonic() >= deadline:
+                        image_url = None
+                        skipped = True
+                    else:
+                        try:
+                            image_url = helpers.get_artwork_image(artwork_title, artist_name, GOOGLE_API_KEY,
+                                                                  GOOGLE_CSE_ID, deadline)
+                        except rate_limits.RateLimitTimeout:
+                            # no turn to search came up before the deadline
+                            image_url = None
+                            skipped = True
                     event["artwork_image_url"] = image_url
                 artwork_title_set.add(artwork_title)
             # set image URL to None so the key exists
             else:
                 event["artwork_image_url"] = None 
             del event["related_artwork"] # once done, remove this key from event
+    return skipped
+
+### Batch requests ###
+
+class BatchRequest(BaseModel):
+    items: list[AgentsRequest]
+
+MAX_BATCH_ITEMS = 500
+# worker pool shared by all batch requests, each worker running its own agent set
+BATCH_WORKERS = int(os.getenv("BATCH_WORKERS", 4))
+batch_executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix="batch-worker")
+
+# jobs currently queued or running in the pool by result store key, so that the same
+# (artist, artwork, scope) requested again (in the same or another batch) shares one run
+inflight_jobs = {}
+inflight_jobs_lock = threading.Lock()
+
+# The backend's /agent result store, if its database can be opened from here (it is normally
+# next to the backend, see result_store.py); None if it is unavailable
+result_store_state = {"store": None, "checked": False}
+result_store_lock = threading.Lock()
+
+def get_result_store():
+    with result_store_lock:
+        if not result_store_state["checked"]:
+            result_store_state["checked"] = True
+            try:
+                result_store_state["store"] = result_store.ResultStore()
+            except Exception as e:
+                print(f"Warning: /agent result store unavailable, batch results won't be cached ({e})")
+        return result_store_state["store"]
+
+# Runs one (artist, artwork, scope) job on the calling worker's agent set, answering it from the
+# result store when a fresh result is there and storing complete results in it otherwise
+# Returns (payload, whether it came from the result store)
+def run_batch_job(request: AgentsRequest, key: str):
+    store = get_result_store()
+    if store is not None and store.is_fresh(key):
+        body = store.get(key)[0]
+        message = json.loads(body[len("data:"):].split("\n", 1)[0])
+        return message["data"], True
+
+    payload = None
+    for status, content in run_pipeline(request, worker_agent_set()):
+        if status == "complete":
+            payload = content
+    if store is not None and not payload.get("partial"):
+        scope = request.context[0]
+        fresh_secs, stale_secs = result_store.ttls_for(scope, request.artworkTitle)
+        store.put(key, result_store.sse_body(complete_message(scope, payload)), fresh_secs, stale_secs)
+    return payload, False
+
+# Returns the future of the job for a key, submitting it to the pool unless it is already in flight
+def submit_batch_job(request: AgentsRequest, key: str):
+    with inflight_jobs_lock:
+        future = inflight_jobs.get(key)
+        if future is None:
+            future = batch_executor.submit(run_batch_job, request, key)
+            inflight_jobs[key] = future
+            future.add_done_callback(lambda _: inflight_jobs.pop(key, None))
+    return future
+
+# Splits the batch into one job per (artist, artwork, scope), dropping duplicates, and streams
+# one NDJSON line per job as they complete (in completion order, not request order)
+async def run_batch_stream(request: BatchRequest):
+    jobs = {}
+    for item in request.items:
+        for scope in item.context:
+            job_request = AgentsRequest(artistName=item.artistName, artworkTitle=item.artworkTitle,
+                                        context=[scope], latencyBudgetSeconds=item.latencyBudgetSeconds)
+            key = result_store.agent_cache_key(item.artistName, [scope], item.artworkTitle)
+            jobs.setdefault(key, job_request)
+
+    async def run_job(job_request, key):
+        line = {"artistName": job_request.artistName, "artworkTitle": job_request.artworkTitle, "scope": job_request.context[0]}
+        try:
+            payload, cached = await asyncio.wrap_future(submit_batch_job(job_request, key))
+            line.update({"status": "complete", "cached": cached, "data": payload})
+            return json.dumps(line)
+        except Exception as e:
+            print(f"Error during batch job for {line}: {e}")
+            line.update({"status": "error", "message": str(e)})
+            return json.dumps(line)
+
+    for next_line in asyncio.as_completed([run_job(job_request, key) for key, job_request in jobs.items()]):
+        yield await next_line + "\n"
 
 ### ENDPOINT(S) ###
 
-# health check endpoint for deploymnet
+# health check endpoint for deploymnet (liveness - responds as soon as the app is up)
 @app.api_route("/", methods=["GET", "HEAD"])
 def root():
     return {"status": "ok", "service": "llm_service"}
 
+# readiness endpoint - only reports ready once the agents and their dependencies are loaded
+@app.api_route("/ready", methods=["GET", "HEAD"])
+def ready():
+    if warm_up_state["ready"]:
+        return {"status": "ready", "service": "llm_service", "promptVersion": prompt_registry.version}
+    status = "error" if warm_up_state["error"] else "warming_up"
+    return JSONResponse(
+        status_code=503,
+        content={"status": status, "service": "llm_service", "error": warm_up_state["error"],
+                 "promptVersion": prompt_registry.version}
+    )
+
+
+# queue depth, wait times and quota use of the outbound limits for each upstream service, and
+# the version of the prompts in use
+@app.get("/metrics")
+def metrics():
+    return {"service": "llm_service", "upstreams": rate_limits.metrics(), "prompts": prompt_registry.metrics()}
+
+# rereads changed prompt files right away instead of waiting for the next poll
+@app.post("/prompts/reload")
+def reload_prompts():
+    reloaded = prompt_registry.reload()
+    return {"reloaded": reloaded, **prompt_registry.metrics()}
+
+# connections stored in the network graph for an artist: the direct neighbours (hops=1) or the
+# wider neighbourhood, following only connections with a score of at least minScore; also lists
+# the artists in it whose own connections are missing or stale (i.e. worth running agents for)
+@app.get("/network")
+def network(artistName: str, hops: int = 1, minScore: int = 1):
+    if hops < 1:
+        raise HTTPException(status_code=400, detail="hops must be at least 1")
+    if hops == 1:
+        return {
+            "artistName": artistName,
+            "networkData": network_graph.neighbours(artistName, minScore),
+            "expanded": network_graph.is_fresh(artistName)
+        }
+    return {"artistName": artistName, **network_graph.neighbourhood(artistName, hops, minScore)}
+
+# events indexed for a scope (political-events or economic-events) whose years overlap the
+# given range, optionally only those at a location containing the given text
+@app.get("/events")
+def events(scope: str, startYear: int, endYear: int, location: Optional[str] = None, limit: int = 50):
+    if endYear < startYear:
+        raise HTTPException(status_code=400, detail="endYear must not be before startYear")
+    return {"timelineEvents": event_index.lookup(scope, startYear, endYear, location, limit=limit)}
 
 # Create a wrapper for the streaming so we return a StreamingResponse
 @app.post("/agent")
@@ -306,44 +614,105 @@ async def run_agents(request: AgentsRequest):
         }
     )
 
-async def run_agents_stream(request: AgentsRequest):
-
-    # Ensure context is a list and not empty before accessing
-    if not request.context or not isinstance(request.context, list):
-        yield f"data: {json.dumps({'status': 'error', 'message': 'Invalid context provided. Expected a non-empty list.'})}\n\n"
-    
-    # Construct query string, which is of the form <Artist Name: [artwork title] [scope]>
-    # or, if no artwork title is provided, <Artist Name: [scope]>
-    scope = request.context[0] # Get the primary scope
+# Construct query string, which is of the form <Artist Name: [artwork title] [scope]>
+# or, if no artwork title is provided, <Artist Name: [scope]>
+def build_query_string(request: AgentsRequest):
     query_string = "<" + request.artistName + ": "
     if(request.artworkTitle):
         query_string += "[" + request.artworkTitle + "] "
     query_string += "[" + ", ".join(request.context) + "]>"
+    return query_string
+
+# JSON for the final message of a successful run, which is also what the /agent result store
+# keeps for each request
+def complete_message(scope: str, payload: dict):
+    return json.dumps({'status': 'complete', 'message': f'Analysis complete for {scope}', 'data': payload})
+
+# Runs the whole pipeline (agents -> parsing -> artwork search) for a request, yielding
+# ("processing", <progress message>) pairs as it goes and finally ("complete", <payload>)
+# Errors are raised to the caller; optionally runs on a specific agent set (see query_agents)
+# If the request has a latency budget, the payload has "partial": true when it had to be cut short
+def run_pipeline(request: AgentsRequest, agent_set: Optional[dict] = None):
+    scope = request.context[0] # Get the primary scope
+    query_string = build_query_string(request)
+    deadline = None
+    if request.latencyBudgetSeconds:
+        deadline = time.monotonic() + request.latencyBudgetSeconds
 
     print(f"Running agents for scope: {scope}")
     print(f"Query string: {query_string}")
 
+    # artist networks found by the agents recently are answered straight from the network graph
+    if scope == "artist-network" and not request.artworkTitle and network_graph.is_fresh(request.artistName):
+        yield "processing", f'Loading stored network for {request.artistName}...'
+        yield "complete", {output_types["network"]["return_key"]: network_graph.neighbours(request.artistName, own_only=True)}
+        return
+
+    # query the agents for a result list + the type which it should be parsed as
+    # we use artwork-title-specific prompts if the request provides the artwork title, and otherwise
+    # use a more general prompt only taking into consideration the artist name
+    yield "processing", f'Querying agents for {scope}...'
+    prompts_key = "artwork_prompts" if request.artworkTitle else "prompts"
+    research_context = research_contexts.get(request.artistName) if scope in SHARED_SCOPES else None
+    seed_notes = "" if request.artworkTitle else event_index.seed_notes(scope, request.artistName)
+    result_str, parse_type, partial = query_agents(scope, query_string, prompts_key, agent_set, deadline,
+                                                   research_context, seed_notes)
+
+    # parse the result string, and if it contains events, search for artworks within it
+    yield "processing", f'Parsing results for {scope}...'
+    result_list = parse_into_list(result_str, parse_type, partial)
+    if(parse_type == "event"):
+        # index the events so they can seed other artists' timelines (only complete, artist-level
+        # results, since artwork-specific events are not representative of the artist's lifetime)
+        if not request.artworkTitle and not partial:
+            event_index.add_events(scope, request.artistName, result_list)
+        yield "processing", 'Finding artworks for detected events...'
+        partial = find_artworks_for_events(result_list, request.artistName, deadline) or partial
+    elif(parse_type == "network" and not request.artworkTitle and not partial):
+        network_graph.add_network(request.artistName, result_list)
+    
+    # return a dictionary with a key depending on the type of data being returned
+    response_key = output_types[parse_type]["return_key"]
+    payload = {response_key: result_list}
+    if partial:
+        payload["partial"] = True
+    yield "complete", payload
+
+# Runs many (artist, scope) requests at once on the shared batch worker pool, streaming results
+# back as NDJSON (one JSON object per line) instead of needing one SSE connection per artist
+@app.post("/agent/batch")
+async def run_agents_batch(request: BatchRequest):
+    if len(request.items) == 0:
+        raise HTTPException(status_code=400, detail="No items provided.")
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"Too many items (at most {MAX_BATCH_ITEMS} per batch).")
+    if any(not item.context for item in request.items):
+        raise HTTPException(status_code=400, detail="Invalid context provided. Expected a non-empty list for every item.")
+    return StreamingResponse(
+        run_batch_stream(request),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# A plain generator, so Starlette iterates it in its threadpool: the pipeline blocks (waiting for
+# the warm-up, the rate limits and the agents), which must not hold up the event loop serving the
+# health checks, metrics and other streams
+def run_agents_stream(request: AgentsRequest):
+
+    # Ensure context is a list and not empty before accessing
+    if not request.context or not isinstance(request.context, list):
+        yield f"data: {json.dumps({'status': 'error', 'message': 'Invalid context provided. Expected a non-empty list.'})}\n\n"
+    
+    scope = request.context[0] # Get the primary scope
+
     yield f"data: {json.dumps({'status': 'processing', 'message': f'Starting analysis for {request.artistName}'})}\n\n"
 
     try:
-        # query the agents for a result list + the type which it should be parsed as
-        # we use artwork-title-specific prompts if the request provides the artwork title, and otherwise
-        # use a more general prompt only taking into consideration the artist name
-        yield f"data: {json.dumps({'status': 'processing', 'message': f'Querying agents for {scope}...'})}\n\n"
-        prompt_files_key = "artwork_prompt_files" if request.artworkTitle else "prompt_files"
-        result_str, parse_type = query_agents(scope, query_string, prompt_files_key)
-
-        # parse the result string, and if it contains events, search for artworks within it
-        yield f"data: {json.dumps({'status': 'processing', 'message': f'Parsing results for {scope}...'})}\n\n"
-        result_list = parse_into_list(result_str, parse_type)
-        if(parse_type == "event"):
-            yield f"data: {json.dumps({'status': 'processing', 'message': 'Finding artworks for detected events...'})}\n\n"
-            find_artworks_for_events(result_list, request.artistName)
-        
-        # return a dictionary with a key depending on the type of data being returned
-        response_key = output_types[parse_type]["return_key"]
-        payload = {response_key: result_list}
-        yield f"data: {json.dumps({'status': 'complete', 'message': f'Analysis complete for {scope}', 'data': payload})}\n\n"
+        for status, content in run_pipeline(request):
+            if status == "complete":
+                yield f"data: {complete_message(scope, content)}\n\n"
+            else:
+                yield f"data: {json.dumps({'status': status, 'message': content})}\n\n"
 
     except HTTPException as http_err:
         # Re-raise HTTP exceptions to be handled by FastAPI
@@ -358,4 +727,3 @@ async def run_agents_stream(request: AgentsRequest):
         else: # Default or political-events
             error_resp["timelineEvents"] = []
         yield f"data: {json.dumps({'status': 'error', 'message': str(e), 'data': error_resp})}\n\n"
-
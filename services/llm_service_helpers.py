@@ -1,37 +1,7 @@
 import re
 import requests
 import copy
-from smolagents import DuckDuckGoSearchTool
-
-#### SEARCH TOOLS
-SEARCH_CALL_LIMIT = 4  # Maximum number of searches per query
-class RateLimitedSearchTool(DuckDuckGoSearchTool):
-    name = "rate_limited_search_tool"
-    description = """Searches the web for the information given in the query, and 
-    returns several links as well as a brief summary of the information found at those links.
-    Limits the number of searches to 4 searches."""
-    inputs = {
-        "query": {
-            "type": "string",
-            "description": "The search query you will perform on the search engine"
-        }
-    }
-    output_type = "string"
-    def __init__(self):
-        super().__init__()
-        self.call_count = 0
-    def forward(self, query):
-        if self.call_count >= SEARCH_CALL_LIMIT:
-            print(f"Search limit hit. Skipping query: {query}")
-            return "No additional searches allowed due to rate limits. Call the final_answer tool and DO NOT ATTEMPT TO SEARCH AGAIN."
-        self.call_count += 1
-        try:
-            return super().forward(query)
-        except Exception as e:
-            print(e)
-            return "Could not search. Call the final_answer tool and DO NOT ATTEMPT TO SEARCH AGAIN."
-    def reset(self):  # Reset after each full query cycle
-        self.call_count = 0
+import rate_limits
 
 #### PARSING HELPERS
 class JSONParser:
@@ -183,8 +153,9 @@ class JSONParser:
         new_info = re.sub(JSONParser.artwork_title_re, JSONParser._replace_artwork_title, info)
         return re.sub(r"\"([,\.])", JSONParser._flip_punctuation, new_info)
 
-# function to search for artwork image URL given title
-def get_artwork_image(artwork_title, artist_name, GOOGLE_API_KEY, GOOGLE_CSE_ID):
+# function to search for artwork image URL given title; if given a deadline (a time.monotonic()
+# timestamp), the search doesn't wait for a turn past it and raises RateLimitTimeout instead
+def get_artwork_image(artwork_title, artist_name, GOOGLE_API_KEY, GOOGLE_CSE_ID, deadline = None):
     # google API key config check
     if not GOOGLE_API_KEY or not GOOGLE_CSE_ID:
         print("Google API Key/CSE ID not configured, skipping image search.")
@@ -202,7 +173,9 @@ def get_artwork_image(artwork_title, artist_name, GOOGLE_API_KEY, GOOGLE_CSE_ID)
             'num': 1 # just get the top result
         }
 
-        response = requests.get(search_url, params=params, timeout=10) # timeout
+        # wait for a turn under the process-wide custom search limits (including the daily quota)
+        with rate_limits.governors["google_cse"].slot(deadline=deadline):
+            response = requests.get(search_url, params=params, timeout=10) # timeout
         response.raise_for_status() # raise an exception for bad status codes
 
         data = response.json()
@@ -222,6 +195,12 @@ def get_artwork_image(artwork_title, artist_name, GOOGLE_API_KEY, GOOGLE_CSE_ID)
 
     except requests.exceptions.RequestException as e:
         print(f"Error fetching image for '{artwork_title}': {e}")
+    except rate_limits.RateLimitTimeout as e:
+        print(f"Skipping image search for '{artwork_title}': {e}")
+        if deadline is not None:
+            raise
+    except rate_limits.QuotaExceeded as e:
+        print(f"Skipping image search for '{artwork_title}': {e}")
     except Exception as e:
         print(f"An unexpected error occurred during image search: {e}")
 
@@ -0,0 +1,109 @@
+# Agent tools used by llm_service; kept apart from llm_service_helpers since importing
+# smolagents is slow, so this module is only imported once the agents are being built
+import threading
+import time
+from smolagents import ActionStep, DuckDuckGoSearchTool, OpenAIServerModel
+import rate_limits
+
+#### SEARCH TOOLS
+SEARCH_CALL_LIMIT = 4  # Maximum number of searches per query
+SEARCH_MIN_SECONDS_LEFT = 15  # No searches are started with less time than this left before the deadline
+class RateLimitedSearchTool(DuckDuckGoSearchTool):
+    name = "rate_limited_search_tool"
+    description = """Searches the web for the information given in the query, and 
+    returns several links as well as a brief summary of the information found at those links.
+    Limits the number of searches to 4 searches."""
+    inputs = {
+        "query": {
+            "type": "string",
+            "description": "The search query you will perform on the search engine"
+        }
+    }
+    output_type = "string"
+    def __init__(self):
+        super().__init__()
+        self.call_count = 0
+        self.deadline = None # time.monotonic() timestamp after which the agent should wrap up
+        self.deadline_hit = False
+        self.research_context = None # artist's shared research context (see research_context.py)
+    def forward(self, query):
+        # queries already searched for this artist (e.g. by another scope) aren't searched again,
+        # and don't count towards the search limit
+        if self.research_context is not None:
+            cached_result = self.research_context.get(query)
+            if cached_result is not None:
+                print(f"Reusing research for query: {query}")
+                return cached_result
+        if self.call_count >= SEARCH_CALL_LIMIT:
+            print(f"Search limit hit. Skipping query: {query}")
+            return "No additional searches allowed due to rate limits. Call the final_answer tool and DO NOT ATTEMPT TO SEARCH AGAIN."
+        if self.deadline is not None and self.deadline - time.monotonic() < SEARCH_MIN_SECONDS_LEFT:
+            print(f"Latency budget running low. Skipping query: {query}")
+            self.deadline_hit = True
+            return "No additional searches allowed due to time limits. Call the final_answer tool now with the information you already have and DO NOT ATTEMPT TO SEARCH AGAIN."
+        try:
+            # wait for a turn under the process-wide DuckDuckGo limits before searching (but not
+            # past the deadline)
+            with rate_limits.governors["duckduckgo"].slot(deadline=self.deadline):
+                self.call_count += 1
+                result = super().forward(query)
+            if self.research_context is not None:
+                self.research_context.add(query, result)
+            return result
+        except rate_limits.RateLimitTimeout as e:
+            print(e)
+            if self.deadline is not None:
+                self.deadline_hit = True
+            return "Could not search. Call the final_answer tool and DO NOT ATTEMPT TO SEARCH AGAIN."
+        except Exception as e:
+            print(e)
+            return "Could not search. Call the final_answer tool and DO NOT ATTEMPT TO SEARCH AGAIN."
+    def reset(self, deadline = None, research_context = None):  # Reset after each full query cycle
+        self.call_count = 0
+        self.deadline = deadline
+        self.deadline_hit = False
+        self.research_context = research_context
+
+#### AGENTS
+# whether an agent's last run ended by hitting its step limit (smolagents then asks the model for
+# a final answer outside the step loop, recording it as a step that isn't a final answer) rather
+# than by the agent giving its final answer
+def hit_step_limit(agent):
+    action_steps = [step for step in agent.memory.steps if isinstance(step, ActionStep)]
+    return bool(action_steps) and not action_steps[-1].is_final_answer
+
+#### MODELS
+# Deadline of the request the current thread is running agents for (set by llm_service.query_agents),
+# since the model is shared by every agent set; model calls don't wait in the queue past it, and
+# deadline_hit records whether one gave up because of it
+request_state = threading.local()
+
+def set_request_deadline(deadline):
+    request_state.deadline = deadline
+    request_state.deadline_hit = False
+
+# moves the current thread's request deadline later (if it is set), e.g. to give a prompt that
+# can't be skipped a last step
+def extend_request_deadline(deadline):
+    current = getattr(request_state, "deadline", None)
+    if current is not None:
+        request_state.deadline = max(current, deadline)
+
+def request_deadline_hit():
+    return getattr(request_state, "deadline_hit", False)
+
+# OpenAI model whose calls all go through the process-wide OpenAI limits, so concurrent
+# requests queue for the API instead of running into its rate limits together
+class GovernedOpenAIServerModel(OpenAIServerModel):
+    def generate(self, *args, **kwargs):
+        deadline = getattr(request_state, "deadline", None)
+        try:
+            rate_limits.governors["openai"].acquire(deadline=deadline)
+        except rate_limits.RateLimitTimeout:
+            if deadline is not None:
+                request_state.deadline_hit = True
+            raise
+        try:
+            return super().generate(*args, **kwargs)
+        finally:
+            rate_limits.governors["openai"].release()
@@ -0,0 +1,208 @@
+# Persistent graph of the artist-network results parsed so far
+# Every parsed networkData entry becomes a weighted edge (the connection score) from the artist
+# to the connected entity, so connections found for one artist are available when exploring
+# the others: artist-network requests for artists expanded recently enough are answered from
+# the graph instead of the agents, and neighbourhoods can be queried directly
+#
+# The graph is stored in SQLite (a node table and an edge table), so the service, its workers and
+# the precompute job can all add to it at once: each update replaces one artist's edges in a single
+# transaction, rather than one process's copy of the whole graph overwriting the others'
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+
+import result_store
+
+DEFAULT_GRAPH_PATH = os.getenv(
+    "NETWORK_GRAPH_PATH",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "network_graph.db")
+)
+# how long an artist's connections are served from the graph before the agents are rerun
+NETWORK_GRAPH_TTL_SECONDS = int(os.getenv("NETWORK_GRAPH_TTL_SECONDS", 14 * 86400))
+
+class NetworkGraph:
+    def __init__(self, path = DEFAULT_GRAPH_PATH, ttl = NETWORK_GRAPH_TTL_SECONDS):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.initialized = False
+
+    # the database is opened (and its tables created) on first use rather than on import, so
+    # importing the service stays cheap; callers hold self.lock
+    def _connect(self):
+        c = sqlite3.connect(self.path, timeout=30)
+        if not self.initialized:
+            with c:
+                self._init(c)
+            self.initialized = True
+        return c
+
+    def _init(self, c):
+        c.execute("PRAGMA journal_mode=WAL")
+        # expanded_at is the unix time the agents last ran for a node (0 if never)
+        c.execute("""
+          CREATE TABLE IF NOT EXISTS nodes(
+            id INTEGER PRIMARY KEY,
+            slug TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            entity_type TEXT NOT NULL,
+            expanded_at INTEGER NOT NULL
+          )
+        """)
+        c.execute("""
+          CREATE TABLE IF NOT EXISTS edges(
+            source INTEGER NOT NULL,
+            target INTEGER NOT NULL,
+            score INTEGER NOT NULL,
+            summary TEXT NOT NULL,
+            duration TEXT NOT NULL,
+            source_url TEXT NOT NULL,
+            PRIMARY KEY(source, target)
+          )
+        """)
+        c.execute("CREATE INDEX IF NOT EXISTS idx_edges_target ON edges(target)")
+
+    #### Updates
+    def _node(self, c, name, entity_type = ""):
+        c.execute("""
+          INSERT INTO nodes(slug, name, entity_type, expanded_at) VALUES(?,?,?,0)
+          ON CONFLICT(slug) DO UPDATE SET
+            entity_type=excluded.entity_type
+          WHERE entity_type='' AND excluded.entity_type!=''
+        """, (result_store.slug(name), name, entity_type))
+        return c.execute("SELECT id FROM nodes WHERE slug=?", (result_store.slug(name),)).fetchone()[0]
+
+    # replaces an artist's connections with a freshly parsed networkData list
+    def add_network(self, artist_name, network_list):
+        with self.lock, self._connect() as c:
+            c.execute("BEGIN IMMEDIATE") # other processes' updates wait for this one
+            source = self._node(c, artist_name)
+            edges = {}
+            for entry in network_list:
+                target = self._node(c, entry["connected_entity_name"], entry["entity_type"])
+                if target == source:
+                    continue
+                # keep the strongest edge if the same entity is listed more than once
+                if target in edges and edges[target][2] >= entry["connection_score"]:
+                    continue
+                edges[target] = (source, target, entry["connection_score"], entry["relationship_summary"],
+                                 entry["relationship_duration"], entry["source_url"])
+            c.execute("DELETE FROM edges WHERE source=?", (source,))
+            c.executemany("INSERT INTO edges(source, target, score, summary, duration, source_url) VALUES(?,?,?,?,?,?)",
+                          edges.values())
+            c.execute("UPDATE nodes SET expanded_at=? WHERE id=?", (int(time.time()), source))
+
+    #### Queries
+    def _find(self, c, artist_name):
+        row = c.execute("SELECT id FROM nodes WHERE slug=?", (result_store.slug(artist_name),)).fetchone()
+        return row[0] if row else None
+
+    # whether the artist's connections were found by the agents recently enough to be reused
+    def is_fresh(self, artist_name):
+        with self.lock, self._connect() as c:
+            row = c.execute("SELECT expanded_at FROM nodes WHERE slug=?", (result_store.slug(artist_name),)).fetchone()
+            return row is not None and time.time() - row[0] < self.ttl
+
+    # (name, score, summary, duration, source) of every connection of a node with at least
+    # min_score, in both directions (unless own_only), preferring the node's own edges if it has
+    # been expanded
+    def _edges(self, c, node, min_score, own_only = False):
+        found = {}
+        for target, score, summary, duration, source_url in c.execute(
+                "SELECT target, score, summary, duration, source_url FROM edges WHERE source=? AND score>=?",
+                (node, min_score)):
+            found[target] = (score, summary, duration, source_url)
+        if own_only:
+            return found
+        for source, score, summary, duration, source_url in c.execute(
+                "SELECT source, score, summary, duration, source_url FROM edges WHERE target=? AND score>=?",
+                (node, min_score)):
+            if source not in found:
+                found[source] = (score, summary, duration, source_url)
+        return found
+
+    # node id -> (name, entity type, expanded_at) for the given nodes
+    def _node_info(self, c, nodes):
+        nodes = list(nodes)
+        info = {}
+        for i in range(0, len(nodes), 500):
+            batch = nodes[i:i + 500]
+            rows = c.execute(f"SELECT id, name, entity_type, expanded_at FROM nodes WHERE id IN ({','.join('?' * len(batch))})", batch)
+            info.update((node, (name, entity_type, expanded_at)) for node, name, entity_type, expanded_at in rows)
+        return info
+
+    # neighbours of an artist as networkData entries (the same structure the network parser
+    # produces), strongest connections first; [] if the artist is not in the graph
+    # With own_only, only the connections found for the artist itself are included (i.e. what
+    # the agents returned for it), leaving out the ones found for other artists pointing at it,
+    # whose summaries are written from the other artist's point of view
+    def neighbours(self, artist_name, min_score = 1, own_only = False):
+        with self.lock, self._connect() as c:
+            node = self._find(c, artist_name)
+            if node is None:
+                return []
+            edges = self._edges(c, node, min_score, own_only)
+            info = self._node_info(c, edges)
+            return [
+                {
+                    "connected_entity_name": info[other][0],
+                    "entity_type": info[other][1],
+                    "relationship_summary": summary,
+                    "relationship_duration": duration,
+                    "connection_score": score,
+                    "source_url": source_url
+                }
+                for other, (score, summary, duration, source_url) in sorted(edges.items(), key=lambda item: -item[1][0])
+            ]
+
+    # all nodes within `hops` connections of an artist (following only edges with at least
+    # min_score) and the edges between them, plus which of those nodes still need their own
+    # connections found by the agents (never expanded, or stale)
+    def neighbourhood(self, artist_name, hops = 2, min_score = 1):
+        with self.lock, self._connect() as c:
+            start = self._find(c, artist_name)
+            if start is None:
+                return {"nodes": [], "edges": [], "unexpanded": [artist_name]}
+            distance = {start: 0}
+            queue = deque([start])
+            found = {}
+            while queue:
+                node = queue.popleft()
+                if distance[node] == hops:
+                    continue
+                for other, (score, summary, duration, source_url) in self._edges(c, node, min_score).items():
+                    key = (min(node, other), max(node, other))
+                    if key not in found or found[key][2] < score:
+                        found[key] = (node, other, score, summary, duration, source_url)
+                    if other not in distance:
+                        distance[other] = distance[node] + 1
+                        queue.append(other)
+            info = self._node_info(c, distance)
+        edges = [
+            {
+                "source": info[node][0],
+                "target": info[other][0],
+                "connection_score": score,
+                "relationship_summary": summary,
+                "relationship_duration": duration,
+                "source_url": source_url
+            }
+            for node, other, score, summary, duration, source_url in found.values()
+        ]
+        now = time.time()
+        nodes = [
+            {
+                "name": info[node][0],
+                "entity_type": info[node][1],
+                "hops": hops_away,
+                "expanded": now - info[node][2] < self.ttl
+            }
+            for node, hops_away in sorted(distance.items(), key=lambda item: item[1])
+        ]
+        unexpanded = [node["name"] for node in nodes if not node["expanded"] and node["hops"] < hops]
+        return {"nodes": nodes, "edges": edges, "unexpanded": unexpanded}
+
+# shared by every request and worker in the process
+network_graph = NetworkGraph()
@@ -7,12 +7,14 @@ import faiss
 import numpy as np
 import requests
 from sentence_transformers import SentenceTransformer
-from langchain.text_splitter import RecursiveCharacterTextSplitter
 from dotenv import load_dotenv
 import os
+import time
 import openai
 from pinecone import Pinecone, ServerlessSpec
 import json
+from text_chunker import chunk_text
+from pinecone_query import DEFAULT_FAISS_INDEX_PATH, DEFAULT_FAISS_DOCS_PATH, EMBED_MODEL, FaissBackend
 
 load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -63,12 +65,9 @@ def load_pinecone_quickstart(data, index_name):
 
     print(index.describe_index_stats())
 
-def chunk_text(text, chunk_size=512, overlap=50):
-    """Splits text into smaller chunks"""
-    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap)
-    return splitter.split_text(text)
-
-def load_jstor(filename, index_name):
+# Loads the JSTOR data into a fresh Pinecone index, and writes the same chunk embeddings and
+# metadata to a local FAISS index and doc store (searched by pinecone_query.FaissBackend offline)
+def load_jstor(filename, index_name, faiss_index_path = DEFAULT_FAISS_INDEX_PATH, faiss_docs_path = DEFAULT_FAISS_DOCS_PATH):
     pc = Pinecone(api_key=PINECONE_API_KEY)
 
     pc.delete_index(index_name)
@@ -100,6 +99,10 @@ def load_jstor(filename, index_name):
 
     index = pc.Index(index_name)
 
+    # inner products of normalized vectors, i.e. the cosine similarity the Pinecone index uses
+    faiss_index = faiss.IndexFlatIP(1024)
+    faiss_docs = []
+
     for data in data_list:
         d_title = data.get("title", "[No Title]")
         d_id = data.get("id", "[No ID]")
@@ -107,17 +110,22 @@ def load_jstor(filename, index_name):
         chunks = chunk_text(data['fullText'][0])
         print(f"num chunks: {len(chunks)}")
         embeddings = pc.inference.embed(
-            model="multilingual-e5-large",
+            model=EMBED_MODEL,
             inputs=[ch for ch in chunks],
             parameters={"input_type": "passage", "truncate": "END"}
         )
 
+        # the publication year lets queries be filtered by year (see pinecone_query.build_filter)
+        metadata = {'title': d_title}
+        if data.get("publicationYear") is not None:
+            metadata['year'] = data["publicationYear"]
+
         vectors = []
         for ch, e in zip(chunks, embeddings):
             vectors.append({
                 "id": d_id,
                 "values": e['values'],
-                "metadata": {'text': ch, 'title': d_title}
+                "metadata": {'text': ch, **metadata}
             })
 
         index.upsert(
@@ -125,9 +133,18 @@ def load_jstor(filename, index_name):
             namespace="ns1"
         )
 
+        if vectors:
+            values = np.array([v["values"] for v in vectors], dtype=np.float32)
+            faiss.normalize_L2(values)
+            faiss_index.add(values)
+            faiss_docs.extend({"id": v["id"], "metadata": v["metadata"]} for v in vectors)
+
     print(f"Done loading, final stats:")
     print(index.describe_index_stats())
 
+    FaissBackend(faiss_index, faiss_docs).save(faiss_index_path, faiss_docs_path)
+    print(f"Wrote local FAISS index ({faiss_index.ntotal} vectors): {faiss_index_path}, {faiss_docs_path}")
+
 
 
 if __name__ == "__main__":
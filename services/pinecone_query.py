@@ -1,44 +1,311 @@
-# seems unused by other services (testing file?)
-
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from typing import List
-import faiss
-import numpy as np
-import requests
-from sentence_transformers import SentenceTransformer
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from dotenv import load_dotenv
+# Query service for the JSTOR chunks indexed by pinecone_build.py
+# One long-lived service holds the vector store client and index handle (instead of creating them
+# on every query), caches query embeddings and results in LRU caches, embeds the queries of a
+# batch in a single call and runs their searches in parallel, and supports metadata filters on
+# the chunks' title and publication year
+#
+# The vector store is swappable: PineconeBackend queries the Pinecone index, while FaissBackend
+# searches a local FAISS index file (with a JSON file holding each vector's id and metadata), so
+# the same queries can run offline. pinecone_build.load_jstor() writes both files from the same
+# multilingual-e5-large passage embeddings it upserts to Pinecone, and FaissBackend embeds queries
+# with a local copy of that model (intfloat/multilingual-e5-large via sentence-transformers,
+# downloaded on first use) so they land in the same embedding space
+# get_query_service() builds the shared service from:
+#   QUERY_BACKEND (pinecone or faiss), PINECONE_INDEX_NAME, PINECONE_NAMESPACE,
+#   FAISS_INDEX_PATH, FAISS_DOCS_PATH, QUERY_CACHE_SIZE, QUERY_CONCURRENCY
+import json
 import os
-import openai
-from pinecone import Pinecone, ServerlessSpec
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
 
 load_dotenv()
-OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 PINECONE_API_KEY = os.getenv("PINECONE_API_KEY")
 
-def query_index(query, index_name):
+DEFAULT_INDEX_NAME = os.getenv("PINECONE_INDEX_NAME", "json-cleaned-sample")
+DEFAULT_NAMESPACE = os.getenv("PINECONE_NAMESPACE", "ns1")
+DEFAULT_FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "jstor.faiss")
+DEFAULT_FAISS_DOCS_PATH = os.getenv("FAISS_DOCS_PATH", "jstor_docs.json")
+# embedding model of the index (Pinecone's hosted name, and the same model for local use)
+EMBED_MODEL = "multilingual-e5-large"
+LOCAL_EMBED_MODEL = "intfloat/multilingual-e5-large"
+DEFAULT_TOP_K = 3
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", 1024))
+# maximum number of searches of a batch run at once
+QUERY_CONCURRENCY = int(os.getenv("QUERY_CONCURRENCY", 4))
+
+#### FILTERS
+# Builds a metadata filter (in Pinecone's filter syntax) for chunks of a given title and/or
+# publication year, or published between two years (inclusive, either end may be None)
+def build_filter(title = None, year = None, year_range = None):
+    conditions = []
+    if title is not None:
+        conditions.append({"title": {"$eq": title}})
+    if year is not None:
+        conditions.append({"year": {"$eq": year}})
+    if year_range is not None:
+        start, end = year_range
+        bounds = {}
+        if start is not None:
+            bounds["$gte"] = start
+        if end is not None:
+            bounds["$lte"] = end
+        if bounds:
+            conditions.append({"year": bounds})
+    if not conditions:
+        return None
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+comparisons = {
+    "$eq": lambda value, target: value == target,
+    "$ne": lambda value, target: value != target,
+    "$gt": lambda value, target: value is not None and value > target,
+    "$gte": lambda value, target: value is not None and value >= target,
+    "$lt": lambda value, target: value is not None and value < target,
+    "$lte": lambda value, target: value is not None and value <= target,
+    "$in": lambda value, target: value in target,
+    "$nin": lambda value, target: value not in target
+}
+
+# whether a chunk's metadata matches a filter in Pinecone's syntax (used to filter locally)
+def matches_filter(metadata, metadata_filter):
+    if not metadata_filter:
+        return True
+    for key, condition in metadata_filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, part) for part in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, part) for part in condition):
+                return False
+        else:
+            value = metadata.get(key)
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            if not all(comparisons[op](value, target) for op, target in condition.items()):
+                return False
+    return True
+
+#### CACHE
+class LRUCache:
+    def __init__(self, max_size = QUERY_CACHE_SIZE):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def metrics(self):
+        with self.lock:
+            return {"size": len(self.entries), "hits": self.hits, "misses": self.misses}
+
+#### BACKENDS
+# A backend embeds query texts (embed(texts) -> list of vectors) and searches the index
+# (search(vector, top_k, metadata_filter) -> list of {"id", "score", "metadata"}, best first)
+
+class PineconeBackend:
+    def __init__(self, index_name = DEFAULT_INDEX_NAME, namespace = DEFAULT_NAMESPACE, api_key = PINECONE_API_KEY,
+                 model = EMBED_MODEL):
+        if not api_key:
+            raise ValueError("Missing Pinecone API Key. Set PINECONE_API_KEY as an environment variable or in a .env file.")
+        from pinecone import Pinecone
+        self.namespace = namespace
+        self.model = model
+        # sized so that every parallel search of a batch gets its own pooled connection
+        self.client = Pinecone(api_key=api_key, connection_pool_maxsize=QUERY_CONCURRENCY)
+        self.index = self.client.Index(index_name)
+
+    def embed(self, texts):
+        embeddings = self.client.inference.embed(
+            model=self.model,
+            inputs=list(texts),
+            parameters={"input_type": "query", "truncate": "END"}
+        )
+        return [embedding["values"] for embedding in embeddings]
+
+    def search(self, vector, top_k, metadata_filter = None):
+        results = self.index.query(
+            namespace=self.namespace,
+            vector=vector,
+            top_k=top_k,
+            filter=metadata_filter,
+            include_values=False,
+            include_metadata=True
+        )
+        return [{"id": match["id"], "score": match["score"], "metadata": match["metadata"] or {}}
+                for match in results["matches"]]
+
+# Searches a local FAISS index; docs[i] is {"id": ..., "metadata": {...}} for the index's i-th vector
+# Filters are applied to the nearest vectors found, searching further out until enough match
+# Queries are embedded with the local e5 model unless another embed_fn(texts) -> vectors is given
+class FaissBackend:
+    def __init__(self, index, docs, embed_fn = None):
+        self.index = index
+        self.docs = docs
+        self.embed_fn = embed_fn or e5_embedder("query")
+        import faiss
+        # L2 distances are turned into scores where higher is better, like Pinecone's
+        self.higher_is_better = index.metric_type == faiss.METRIC_INNER_PRODUCT
+
+    @classmethod
+    def load(cls, index_path, docs_path, embed_fn = None):
+        import faiss
+        with open(docs_path, "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        return cls(faiss.read_index(index_path), docs, embed_fn)
+
+    def save(self, index_path, docs_path):
+        import faiss
+        faiss.write_index(self.index, index_path)
+        with open(docs_path, "w", encoding="utf-8") as f:
+            json.dump(self.docs, f, ensure_ascii=False)
+
+    def embed(self, texts):
+        return self.embed_fn(list(texts))
+
+    def search(self, vector, top_k, metadata_filter = None):
+        import numpy as np
+        query = np.array([vector], dtype=np.float32)
+        total = self.index.ntotal
+        if total == 0:
+            return []
+        k = top_k if not metadata_filter else top_k * 4
+        while True:
+            k = min(k, total)
+            scores, rows = self.index.search(query, k)
+            matches = []
+            for score, row in zip(scores[0], rows[0]):
+                if row < 0:
+                    continue
+                doc = self.docs[row]
+                metadata = doc.get("metadata", {})
+                if matches_filter(metadata, metadata_filter):
+                    matches.append({"id": doc["id"], "score": float(score) if self.higher_is_better else -float(score),
+                                    "metadata": metadata})
+                    if len(matches) == top_k:
+                        return matches
+            if k >= total:
+                return matches
+            k *= 4
+
+# Embeds texts locally with multilingual-e5-large, as Pinecone's inference API does for the given
+# input_type ("query" or "passage", which e5 expects as a prefix of every text); vectors are
+# normalized, so inner products are the cosine similarities the Pinecone index ranks by
+# The model is loaded on first use and shared by every embedder
+e5_model = None
+e5_model_lock = threading.Lock()
+
+def e5_embedder(input_type):
+    prefix = input_type + ": "
+    def embed(texts):
+        global e5_model
+        with e5_model_lock:
+            if e5_model is None:
+                from sentence_transformers import SentenceTransformer
+                e5_model = SentenceTransformer(LOCAL_EMBED_MODEL)
+        vectors = e5_model.encode([prefix + text for text in texts], normalize_embeddings=True)
+        return [vector.tolist() for vector in vectors]
+    return embed
+
+#### SERVICE
+class QueryService:
+    def __init__(self, backend, top_k = DEFAULT_TOP_K, cache_size = QUERY_CACHE_SIZE, concurrency = QUERY_CONCURRENCY):
+        self.backend = backend
+        self.top_k = top_k
+        self.embeddings = LRUCache(cache_size) # query text -> vector
+        self.results = LRUCache(cache_size)    # (query text, top_k, filter) -> matches
+        self.executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="query-service")
+
+    @staticmethod
+    def _result_key(text, top_k, metadata_filter):
+        return (text, top_k, json.dumps(metadata_filter, sort_keys=True) if metadata_filter else None)
+
+    # vectors for the texts, embedding the ones not cached in a single call
+    def _embed(self, texts):
+        vectors = {text: self.embeddings.get(text) for text in texts}
+        missing = [text for text, vector in vectors.items() if vector is None]
+        if missing:
+            for text, vector in zip(missing, self.backend.embed(missing)):
+                self.embeddings.put(text, vector)
+                vectors[text] = vector
+        return vectors
+
+    # the top_k chunks closest to a query text, optionally only those matching a metadata filter
+    # (see build_filter()), as a list of {"id", "score", "metadata"}
+    def query(self, text, top_k = None, metadata_filter = None):
+        return self.query_many([text], top_k, metadata_filter)[0]
+
+    # results for many query texts at once, in the same order; queries not cached are embedded
+    # together and searched in parallel
+    def query_many(self, texts, top_k = None, metadata_filter = None):
+        top_k = top_k or self.top_k
+        results = {}
+        pending = []
+        for text in dict.fromkeys(texts):
+            cached = self.results.get(self._result_key(text, top_k, metadata_filter))
+            if cached is None:
+                pending.append(text)
+            else:
+                results[text] = cached
+        if pending:
+            vectors = self._embed(pending)
+            searches = self.executor.map(lambda text: self.backend.search(vectors[text], top_k, metadata_filter), pending)
+            for text, matches in zip(pending, searches):
+                self.results.put(self._result_key(text, top_k, metadata_filter), matches)
+                results[text] = matches
+        return [results[text] for text in texts]
 
-    pc = Pinecone(api_key=PINECONE_API_KEY)
-    index = pc.Index(index_name)
+    def metrics(self):
+        return {"embeddings": self.embeddings.metrics(), "results": self.results.metrics()}
 
-    embedding = pc.inference.embed(
-        model="multilingual-e5-large",
-        inputs=[query],
-        parameters={
-            "input_type": "query"
-        }
-    )
+query_service = None
+index_services = {} # index name -> query service, for Pinecone indexes other than the default one
+query_service_lock = threading.Lock()
 
-    results = index.query(
-        namespace="ns1",
-        vector=embedding[0].values,
-        top_k=3,
-        include_values=False,
-        include_metadata=True
-    )
+# Returns the process-wide query service, creating it on first use with the backend chosen by
+# QUERY_BACKEND ("pinecone" by default, or "faiss" to search a local index file offline)
+def get_query_service():
+    global query_service
+    with query_service_lock:
+        if query_service is None:
+            backend_name = os.getenv("QUERY_BACKEND", "pinecone")
+            if backend_name == "faiss":
+                backend = FaissBackend.load(DEFAULT_FAISS_INDEX_PATH, DEFAULT_FAISS_DOCS_PATH)
+            elif backend_name == "pinecone":
+                backend = PineconeBackend()
+            else:
+                raise ValueError(f"Unknown QUERY_BACKEND '{backend_name}', expected 'pinecone' or 'faiss'")
+            query_service = QueryService(backend)
+    return query_service
 
-    return results
+# Queries an index by name, returning {"matches": [...]} (as Pinecone's query results do)
+def query_index(query, index_name = DEFAULT_INDEX_NAME, top_k = DEFAULT_TOP_K, metadata_filter = None):
+    if index_name == DEFAULT_INDEX_NAME:
+        service = get_query_service()
+    else:
+        with query_service_lock:
+            if index_name not in index_services:
+                index_services[index_name] = QueryService(PineconeBackend(index_name))
+            service = index_services[index_name]
+    return {"matches": service.query(query, top_k, metadata_filter)}
 
 
 def print_results(results):
@@ -51,4 +318,4 @@ if __name__ == "__main__":
     index_name = "json-cleaned-sample"
     query = "Claude Monet and Impressionism"
     results = query_index(query, index_name)
-    print_results(results)    
+    print_results(results)
@@ -0,0 +1,228 @@
+# Batch job that precomputes /agent results for a list of artists (by default the curated list
+# shown by the frontend) across every scope, writing the final messages straight into the /agent
+# result store so that later requests for them are served as cache hits by the backend
+#
+# Usage (from the services directory):
+#   python precompute.py [--artists ../frontend/src/artistList.js] [--artworks artworks.json]
+#                        [--scopes genre medium ...] [--workers 4] [--rate 20] [--force]
+#
+# Progress is appended to a journal file as each (artist, artwork, scope) finishes, so an
+# interrupted run picks up where it left off when restarted with the same journal
+import argparse
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import rate_limits
+import result_store
+from event_index import LIFETIME_SCOPE
+from prompt_registry import prompt_registry
+
+DEFAULT_ARTISTS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "frontend", "src", "artistList.js")
+DEFAULT_JOURNAL_PATH = "precompute_journal.jsonl"
+
+# gpt-4o-mini pricing in USD per 1M tokens, used for the cost estimate in the summary
+INPUT_TOKEN_COST = 0.15
+OUTPUT_TOKEN_COST = 0.60
+
+#### INPUTS
+# Loads the artists to precompute as a list of {"name": ..., "artworks": [...], "lifespan": [start, end]}
+# (artworks and lifespan being optional) from either the frontend's artistList.js, a JSON list
+# (of names or of such objects) or a text file of names
+def load_artists(path):
+    with open(path, "r", encoding="utf-8") as f:
+        contents = f.read()
+    if path.endswith(".js"):
+        names = re.findall(r"name:\s*'((?:[^'\\]|\\.)*)'", contents)
+        names = [name.replace("\\'", "'") for name in names]
+    elif path.endswith(".json"):
+        names = json.loads(contents)
+    else:
+        names = [line.strip() for line in contents.splitlines() if line.strip()]
+    return [n if isinstance(n, dict) else {"name": n} for n in names]
+
+# Merges known artworks ({artist name: [titles]}) into the loaded artists
+def add_artworks(artists, path):
+    with open(path, "r", encoding="utf-8") as f:
+        artworks = json.load(f)
+    for artist in artists:
+        artist.setdefault("artworks", [])
+        artist["artworks"] += [t for t in artworks.get(artist["name"], []) if t not in artist["artworks"]]
+
+# Lists every (artist, artwork title or None, scope) job; artwork jobs are only created for scopes
+# that support artwork titles
+# Each artist's personal events come first, since they give the lifetime used to seed the
+# artist's political/economic researchers with known events (see event_index.py)
+def build_jobs(artists, scopes, scope_info):
+    scopes = sorted(scopes, key=lambda scope: scope != LIFETIME_SCOPE)
+    jobs = []
+    for artist in artists:
+        for scope in scopes:
+            jobs.append((artist["name"], None, scope))
+        for title in artist.get("artworks", []):
+            for scope in scopes:
+                if scope_info[scope]["artwork_prompts"]:
+                    jobs.append((artist["name"], title, scope))
+    return jobs
+
+def job_key(job):
+    artist_name, artwork_title, scope = job
+    return result_store.agent_cache_key(artist_name, [scope], artwork_title)
+
+#### RUNNER
+class Precomputer:
+    def __init__(self, store, journal_path, workers, per_minute, force = False):
+        self.store = store
+        self.journal_path = journal_path
+        self.workers = workers
+        # global budget on how many jobs may be started per minute across all workers (on top of
+        # the per-upstream limits that every agent/search/image call goes through anyway)
+        self.budget = rate_limits.Governor("precompute", per_second=per_minute / 60.0, burst=max(per_minute, 1))
+        self.force = force
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.stats = {"done": 0, "failed": 0, "skipped": 0, "total": 0}
+        self.started_at = time.monotonic()
+
+    # keys of jobs that completed in a previous (possibly interrupted) run with the current
+    # prompts, and of those only ever completed with an older version of the prompts (which are
+    # run again, even if their results are still fresh in the store)
+    def load_journal(self):
+        done, outdated = set(), set()
+        if not os.path.exists(self.journal_path):
+            return done, outdated
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue # partially written line from an interrupted run
+                if entry.get("status") != "ok":
+                    continue
+                if entry.get("prompts") == prompt_registry.version:
+                    done.add(entry["key"])
+                else:
+                    outdated.add(entry["key"])
+        return done, outdated - done
+
+    def record(self, job, status, elapsed, prompt_version, error = None):
+        artist_name, artwork_title, scope = job
+        entry = {"key": job_key(job), "artist": artist_name, "artwork": artwork_title, "scope": scope,
+                 "prompts": prompt_version, "status": status, "seconds": round(elapsed, 1), "at": int(time.time())}
+        if error:
+            entry["error"] = error
+        with self.lock:
+            with open(self.journal_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+            self.stats["done" if status == "ok" else "failed"] += 1
+            finished = self.stats["done"] + self.stats["failed"] + self.stats["skipped"]
+            label = artist_name + (f" [{artwork_title}]" if artwork_title else "")
+            print(f"[{finished}/{self.stats['total']}] {label} / {scope}: {status} ({elapsed:.1f}s)" + (f" - {error}" if error else ""))
+
+    # waits for the job budget, returning False if the run is being stopped
+    def wait_for_budget(self):
+        while not self.stop_event.is_set():
+            try:
+                self.budget.acquire(timeout=1)
+                self.budget.release() # only the start rate is budgeted, not jobs in flight
+                return True
+            except rate_limits.RateLimitTimeout:
+                continue
+        return False
+
+    def run_job(self, llm_service, job):
+        if not self.wait_for_budget():
+            return
+        artist_name, artwork_title, scope = job
+        request = llm_service.AgentsRequest(artistName=artist_name, artworkTitle=artwork_title, context=[scope])
+        prompt_version = prompt_registry.version
+        start = time.monotonic()
+        try:
+            payload = None
+            # each worker thread runs its own agents, since agents keep per-run state
+            for status, content in llm_service.run_pipeline(request, llm_service.worker_agent_set()):
+                if status == "complete":
+                    payload = content
+            body = result_store.sse_body(llm_service.complete_message(scope, payload))
+            fresh_secs, stale_secs = result_store.ttls_for(scope, artwork_title)
+            self.store.put(job_key(job), body, fresh_secs, stale_secs)
+            self.record(job, "ok", time.monotonic() - start, prompt_version)
+        except Exception as e:
+            self.record(job, "failed", time.monotonic() - start, prompt_version, str(e))
+
+    def run(self, jobs):
+        import llm_service
+        llm_service.warm_up()
+
+        done, outdated = self.load_journal()
+        pending = []
+        for job in jobs:
+            key = job_key(job)
+            if not self.force and (key in done or (key not in outdated and self.store.is_fresh(key))):
+                self.stats["skipped"] += 1
+            else:
+                pending.append(job)
+        self.stats["total"] = len(jobs)
+        print(f"Prompt version {prompt_registry.version}")
+        print(f"{len(jobs)} jobs, {self.stats['skipped']} already done, {len(pending)} to run with {self.workers} workers")
+
+        executor = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            futures = [executor.submit(self.run_job, llm_service, job) for job in pending]
+            for future in as_completed(futures):
+                future.result()
+        except KeyboardInterrupt:
+            print("Interrupted: finishing jobs in progress (rerun to resume)...")
+            self.stop_event.set()
+            executor.shutdown(wait=True, cancel_futures=True)
+        finally:
+            executor.shutdown(wait=True)
+            self.print_summary()
+
+    def print_summary(self):
+        import llm_service
+        usage = {"agent_runs": 0, "searches": 0, "input_tokens": 0, "output_tokens": 0}
+        for agent_set in llm_service.worker_agent_sets:
+            for key in usage:
+                usage[key] += agent_set["usage"][key]
+        cost = (usage["input_tokens"] * INPUT_TOKEN_COST + usage["output_tokens"] * OUTPUT_TOKEN_COST) / 1_000_000
+        elapsed = time.monotonic() - self.started_at
+        print("---- Precompute summary ----")
+        print(f"Jobs: {self.stats['total']} total, {self.stats['done']} done, {self.stats['failed']} failed, {self.stats['skipped']} skipped")
+        print(f"Elapsed: {elapsed / 60:.1f} min")
+        print(f"Agent runs: {usage['agent_runs']}, searches: {usage['searches']}")
+        print(f"Tokens: {usage['input_tokens']:,} input, {usage['output_tokens']:,} output (~${cost:.2f})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute /agent results for a list of artists.")
+    parser.add_argument("--artists", default=DEFAULT_ARTISTS_PATH, help="artistList.js, a JSON list or a text file with one artist per line")
+    parser.add_argument("--artworks", help="JSON file mapping artist names to lists of known artwork titles")
+    parser.add_argument("--scopes", nargs="+", help="scopes to precompute (default: all)")
+    parser.add_argument("--workers", type=int, default=4, help="number of jobs to run at once")
+    parser.add_argument("--rate", type=int, default=20, help="maximum number of jobs started per minute")
+    parser.add_argument("--journal", default=DEFAULT_JOURNAL_PATH, help="progress file used to resume interrupted runs")
+    parser.add_argument("--db", default=result_store.DEFAULT_DB_PATH, help="path to the backend's result store database")
+    parser.add_argument("--force", action="store_true", help="recompute jobs even if they are done or cached")
+    args = parser.parse_args()
+
+    from llm_service import scope_info
+    scopes = args.scopes or [scope for scope in scope_info if scope != "default"]
+    unknown = [scope for scope in scopes if scope not in scope_info]
+    if unknown:
+        parser.error("unknown scope(s): " + ", ".join(unknown))
+
+    artists = load_artists(args.artists)
+    if args.artworks:
+        add_artworks(artists, args.artworks)
+
+    # known lifetimes let researchers be seeded with already-indexed events from the start
+    from event_index import event_index
+    for artist in artists:
+        if artist.get("lifespan"):
+            event_index.set_artist_span(artist["name"], *artist["lifespan"])
+
+    precomputer = Precomputer(result_store.ResultStore(args.db), args.journal, args.workers, args.rate, args.force)
+    precomputer.run(build_jobs(artists, scopes, scope_info))
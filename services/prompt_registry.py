@@ -0,0 +1,145 @@
+# Registry of the agents' prompt files (the *_prompt.txt files in this directory, so other text
+# files there such as requirements.txt don't count towards the prompts or their version)
+# Prompts are loaded, hashed and checked to be valid Jinja templates (smolagents renders system
+# prompts as templates) into an immutable snapshot, and the files are polled for changes so a
+# tuned prompt goes live without restarting the service: a changed file is only swapped in once
+# it has been read and compiled successfully, otherwise the previous version is kept
+#
+# Every snapshot has a version hash covering all the prompts in it, which results computed with
+# those prompts can be tagged with (e.g. the precompute journal) and which /ready and /metrics
+# report, so it is clear which prompts a worker is running
+import hashlib
+import os
+import threading
+import time
+
+from jinja2 import Environment, TemplateSyntaxError
+
+DEFAULT_PROMPT_DIR = os.path.dirname(os.path.abspath(__file__))
+PROMPT_SUFFIX = "_prompt.txt"
+# how often the prompt files are checked for changes (0 turns the polling off)
+PROMPT_RELOAD_SECONDS = float(os.getenv("PROMPT_RELOAD_SECONDS", 5))
+
+jinja_env = Environment()
+
+class PromptSnapshot:
+    def __init__(self, files, loaded_at):
+        self.files = files # prompt name -> (text, sha256, mtime)
+        self.loaded_at = loaded_at
+        digest = hashlib.sha256()
+        for name in sorted(files):
+            digest.update(name.encode("utf-8") + b"\0" + files[name][1].encode("ascii"))
+        self.version = digest.hexdigest()[:12]
+
+    def get(self, name):
+        entry = self.files.get(name)
+        return entry[0] if entry else None
+
+    # the texts of the named prompts, in order, or [] if any of them is missing
+    def prompts(self, names):
+        texts = [self.get(name) for name in names]
+        return [] if None in texts else texts
+
+class PromptRegistry:
+    def __init__(self, directory = DEFAULT_PROMPT_DIR):
+        self.directory = directory
+        self.lock = threading.Lock() # serializes reloads; reads just take the current snapshot
+        self.snapshot = PromptSnapshot({}, 0)
+        self.reloads = 0 # number of times a changed set of prompts was swapped in
+        self.errors = {} # prompt name -> (mtime, error) of the last failed attempt to load it
+        self.watcher = None
+        self.reload()
+
+    def _read(self, path):
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        jinja_env.parse(text) # raises TemplateSyntaxError for a broken template
+        return text
+
+    # rereads the prompt files whose modification time changed since the last load and swaps in
+    # a new snapshot if anything changed; returns whether it did
+    def reload(self):
+        with self.lock:
+            current = self.snapshot.files
+            try:
+                names = sorted(f for f in os.listdir(self.directory) if f.endswith(PROMPT_SUFFIX))
+            except OSError as e:
+                print(f"Warning: could not list prompt files in {self.directory} ({e}), keeping version {self.snapshot.version}")
+                return False
+            files = {}
+            changed = False
+            for file_name in names:
+                name = file_name[:-len(".txt")]
+                path = os.path.join(self.directory, file_name)
+                mtime = None
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                    unchanged = name in current and current[name][2] == mtime
+                    # a broken file is only retried once it is modified again
+                    if unchanged or (name in self.errors and self.errors[name][0] == mtime):
+                        if name in current:
+                            files[name] = current[name]
+                        continue
+                    text = self._read(path)
+                except (OSError, UnicodeDecodeError, TemplateSyntaxError) as e:
+                    self.errors[name] = (mtime, f"{type(e).__name__}: {e}")
+                    if name in current:
+                        print(f"Warning: could not reload prompt {name} ({e}), keeping the previous version")
+                        files[name] = current[name]
+                    else:
+                        print(f"Warning: could not load prompt {name} ({e})")
+                    continue
+                self.errors.pop(name, None)
+                sha = hashlib.sha256(text.encode("utf-8")).hexdigest()
+                files[name] = (text, sha, mtime)
+                changed = changed or name not in current or current[name][1] != sha
+            # prompts whose files were deleted are dropped as well
+            for name in [name for name in self.errors if name + ".txt" not in names]:
+                del self.errors[name]
+            changed = changed or len(files) != len(current)
+            first_load = not self.snapshot.loaded_at
+            if not changed and not first_load:
+                return False
+            previous = self.snapshot.version
+            self.snapshot = PromptSnapshot(files, time.time())
+            if not first_load:
+                self.reloads += 1
+                print(f"Reloaded prompts: version {previous} -> {self.snapshot.version}")
+            return True
+
+    def current(self):
+        return self.snapshot
+
+    @property
+    def version(self):
+        return self.snapshot.version
+
+    # polls the prompt files for changes in a background thread (at most one per registry)
+    def start_watching(self, interval = PROMPT_RELOAD_SECONDS):
+        if interval <= 0 or self.watcher is not None:
+            return
+        def watch():
+            while True:
+                time.sleep(interval)
+                try:
+                    self.reload()
+                except Exception as e:
+                    print(f"Warning: prompt reload failed ({e})")
+        self.watcher = threading.Thread(target=watch, name="prompt-registry-watcher", daemon=True)
+        self.watcher.start()
+
+    def metrics(self):
+        snapshot = self.snapshot
+        # reload() may be changing the errors meanwhile
+        with self.lock:
+            errors = {name: error for name, (mtime, error) in self.errors.items()}
+        return {
+            "version": snapshot.version,
+            "prompts": len(snapshot.files),
+            "loaded_at": int(snapshot.loaded_at),
+            "reloads": self.reloads,
+            "errors": errors
+        }
+
+# shared by every request and worker in the process
+prompt_registry = PromptRegistry()
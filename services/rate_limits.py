@@ -0,0 +1,184 @@
+# Process-wide limits on outbound calls to each upstream service (OpenAI, DuckDuckGo and the
+# Google custom search engine), shared by every request, agent and worker thread
+# Each upstream gets a Governor combining a token bucket (requests per second, with bursts),
+# a cap on calls in flight at once and an optional daily quota. Callers wait in a FIFO queue
+# until all three allow the call, up to a deadline, instead of hitting the upstream's 429s
+#
+# Limits are configured with environment variables named after the upstream, e.g.
+#   OPENAI_RPS, OPENAI_BURST, OPENAI_MAX_IN_FLIGHT, OPENAI_DAILY_QUOTA, OPENAI_TIMEOUT
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Longest wait for a turn on a thread running an asyncio event loop (e.g. a call made straight from
+# an async endpoint), where waiting would stall every other request the loop is serving; calls that
+# can wait longer should be made from a worker thread
+EVENT_LOOP_TIMEOUT = float(os.getenv("RATE_LIMIT_EVENT_LOOP_TIMEOUT", 1))
+
+def on_event_loop():
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+class RateLimitTimeout(RuntimeError):
+    pass
+
+class QuotaExceeded(RuntimeError):
+    pass
+
+class Governor:
+    # per_second/max_in_flight/daily_quota of None mean no limit of that kind; timeout is
+    # the default number of seconds callers wait in the queue before giving up
+    def __init__(self, name, per_second = None, burst = None, max_in_flight = None, daily_quota = None, timeout = None):
+        self.name = name
+        self.per_second = per_second
+        self.burst = burst if burst else max(1, int(per_second or 1))
+        self.max_in_flight = max_in_flight
+        self.daily_quota = daily_quota
+        self.timeout = timeout
+
+        self.cond = threading.Condition()
+        self.queue = deque() # tickets of waiting callers, served in arrival order
+        self.tokens = float(self.burst)
+        self.last_refill = time.monotonic()
+        self.in_flight = 0
+        self.quota_day = self._today()
+        self.quota_used = 0
+
+        # totals for metrics
+        self.granted = 0
+        self.timeouts = 0
+        self.quota_rejections = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @staticmethod
+    def _today():
+        return datetime.now(timezone.utc).date()
+
+    def _refill(self, now):
+        if self.per_second:
+            self.tokens = min(self.burst, self.tokens + (now - self.last_refill) * self.per_second)
+        self.last_refill = now
+
+    def _check_quota(self):
+        today = self._today()
+        if today != self.quota_day:
+            self.quota_day = today
+            self.quota_used = 0
+        if self.daily_quota is not None and self.quota_used >= self.daily_quota:
+            self.quota_rejections += 1
+            raise QuotaExceeded(f"Daily quota of {self.daily_quota} calls to {self.name} used up")
+
+    # Waits for a turn to call the upstream, raising RateLimitTimeout if it doesn't come within
+    # `timeout` seconds (the governor's default if not given, waiting forever if that is None),
+    # before `deadline` (a time.monotonic() timestamp, e.g. a request's latency budget) or, on an
+    # event loop's thread, within EVENT_LOOP_TIMEOUT, and QuotaExceeded if the daily quota has
+    # been used up; every successful acquire() must be followed by a release() once the call is
+    # done (see slot())
+    def acquire(self, timeout = None, deadline = None):
+        timeout = self.timeout if timeout is None else timeout
+        if on_event_loop():
+            timeout = EVENT_LOOP_TIMEOUT if timeout is None else min(timeout, EVENT_LOOP_TIMEOUT)
+        start = time.monotonic()
+        if deadline is not None:
+            until_deadline = max(0.0, deadline - start)
+            timeout = until_deadline if timeout is None else min(timeout, until_deadline)
+        give_up_at = None if timeout is None else start + timeout
+        ticket = object()
+        with self.cond:
+            self._check_quota()
+            self.queue.append(ticket)
+            try:
+                while True:
+                    now = time.monotonic()
+                    wait = None # wait for a release() unless a token is what we're missing
+                    # only the caller at the front of the queue may take a turn, so callers are
+                    # served in order and can't be starved by later arrivals
+                    if self.queue[0] is ticket:
+                        self._check_quota()
+                        self._refill(now)
+                        if self.max_in_flight is None or self.in_flight < self.max_in_flight:
+                            if not self.per_second or self.tokens >= 1:
+                                if self.per_second:
+                                    self.tokens -= 1
+                                self.in_flight += 1
+                                self.quota_used += 1
+                                self._record_wait(now - start)
+                                return
+                            wait = (1 - self.tokens) / self.per_second
+                    if give_up_at is not None:
+                        remaining = give_up_at - now
+                        if remaining <= 0:
+                            self.timeouts += 1
+                            raise RateLimitTimeout(f"Timed out after {timeout:.1f}s waiting to call {self.name}")
+                        wait = remaining if wait is None else min(wait, remaining)
+                    self.cond.wait(wait)
+            finally:
+                self.queue.remove(ticket)
+                self.cond.notify_all()
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    @contextmanager
+    def slot(self, timeout = None, deadline = None):
+        self.acquire(timeout, deadline)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _record_wait(self, waited):
+        self.granted += 1
+        self.total_wait += waited
+        self.max_wait = max(self.max_wait, waited)
+
+    def metrics(self):
+        with self.cond:
+            return {
+                "queue_depth": len(self.queue),
+                "in_flight": self.in_flight,
+                "granted": self.granted,
+                "timeouts": self.timeouts,
+                "quota_rejections": self.quota_rejections,
+                "quota_used_today": self.quota_used,
+                "daily_quota": self.daily_quota,
+                "avg_wait_seconds": round(self.total_wait / self.granted, 3) if self.granted else 0.0,
+                "max_wait_seconds": round(self.max_wait, 3)
+            }
+
+# Builds a governor for an upstream, letting <PREFIX>_* environment variables override defaults
+def governor_from_env(name, prefix, per_second = None, burst = None, max_in_flight = None, daily_quota = None, timeout = None):
+    def env(key, default, cast):
+        value = os.getenv(prefix + "_" + key)
+        if value is None or value == "":
+            return default
+        return None if value.lower() == "none" else cast(value)
+    return Governor(
+        name,
+        per_second = env("RPS", per_second, float),
+        burst = env("BURST", burst, int),
+        max_in_flight = env("MAX_IN_FLIGHT", max_in_flight, int),
+        daily_quota = env("DAILY_QUOTA", daily_quota, int),
+        timeout = env("TIMEOUT", timeout, float)
+    )
+
+# one governor per upstream, shared across the whole process
+governors = {
+    "openai": governor_from_env("openai", "OPENAI", per_second=5, burst=10, max_in_flight=8, timeout=120),
+    "duckduckgo": governor_from_env("duckduckgo", "DDG", per_second=1, burst=2, max_in_flight=2, timeout=30),
+    # the free tier of the custom search JSON API allows 100 queries per day
+    "google_cse": governor_from_env("google_cse", "GOOGLE_CSE", per_second=5, burst=5, max_in_flight=4, daily_quota=100, timeout=15)
+}
+
+def metrics():
+    return {name: governor.metrics() for name, governor in governors.items()}
@@ -0,0 +1,80 @@
+# Artist-level research context shared between scopes
+# The political-events, personal-events, economic-events and art-movements researchers all search
+# the same biographical ground for an artist, so the search results gathered for an artist by any
+# of them are kept for a while and handed to the others: repeated queries are answered from the
+# context, and the gathered results are included in the researcher's task so it only needs to
+# search for what is still missing
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import result_store
+
+# scopes whose researchers share an artist's research context
+SHARED_SCOPES = {"political-events", "personal-events", "economic-events", "art-movements"}
+
+# how long an artist's gathered research is reused for, and how many artists are kept at once
+RESEARCH_CONTEXT_TTL_SECONDS = int(os.getenv("RESEARCH_CONTEXT_TTL_SECONDS", 6 * 3600))
+MAX_ARTISTS = int(os.getenv("RESEARCH_CONTEXT_MAX_ARTISTS", 256))
+# cap on how much gathered research is added to a researcher's task
+MAX_NOTES_CHARS = 8000
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+class ResearchContext:
+    def __init__(self, artist_name):
+        self.artist_name = artist_name
+        self.created_at = time.monotonic()
+        self.results = OrderedDict() # normalized query -> (query, search result)
+        self.lock = threading.Lock()
+
+    def get(self, query):
+        with self.lock:
+            entry = self.results.get(normalize_query(query))
+        return entry[1] if entry else None
+
+    def add(self, query, result):
+        with self.lock:
+            self.results[normalize_query(query)] = (query, result)
+
+    # gathered search results formatted to be appended to a researcher's task, most recent
+    # first and truncated to max_chars; "" if nothing has been gathered yet
+    def notes(self, max_chars = MAX_NOTES_CHARS):
+        with self.lock:
+            entries = list(self.results.values())
+        if not entries:
+            return ""
+        notes = ("Web research already gathered for " + self.artist_name + " (reuse it, and only search "
+                 "for information that is still missing):\n")
+        for query, result in reversed(entries):
+            entry = "\nSearch: " + query + "\n" + result.strip() + "\n"
+            if len(notes) + len(entry) > max_chars:
+                break
+            notes += entry
+        return notes
+
+class ResearchContextStore:
+    def __init__(self, ttl = RESEARCH_CONTEXT_TTL_SECONDS, max_artists = MAX_ARTISTS):
+        self.ttl = ttl
+        self.max_artists = max_artists
+        self.contexts = OrderedDict() # artist slug -> ResearchContext, least recently used first
+        self.lock = threading.Lock()
+
+    # returns the artist's context, starting a new one if there is none or it has expired
+    def get(self, artist_name):
+        key = result_store.slug(artist_name)
+        now = time.monotonic()
+        with self.lock:
+            context = self.contexts.get(key)
+            if context is None or now - context.created_at > self.ttl:
+                context = ResearchContext(artist_name)
+                self.contexts[key] = context
+            self.contexts.move_to_end(key)
+            while len(self.contexts) > self.max_artists:
+                self.contexts.popitem(last=False)
+        return context
+
+# shared by every request and worker in the process
+research_contexts = ResearchContextStore()
@@ -0,0 +1,106 @@
+# Python-side access to the /agent result store, i.e. the SQLite cache that the Java backend's
+# ArtworkCacheFilter/SqliteHttpCache reads completed /api/agent responses from
+# Keys, TTLs and the stored body format mirror the Java code, so entries written from here (e.g.
+# by the precompute job) are served by the backend as cache hits and expire when the backend's own
+# entries for the same request would
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# same default location as the backend when it is run from the backend directory
+DEFAULT_DB_PATH = os.getenv(
+    "ARTIST_HTTP_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend", "artist_http_cache.db")
+)
+DAY_SECS = 86400
+
+#### KEYS (see ArtworkCacheFilter.keyFor)
+def slug(s):
+    return "" if s is None else re.sub(r"\s+", "-", s.lower().strip())
+
+def stable_context(context):
+    # context may be given either as the raw comma-separated query parameter or as a list
+    parts = context.split(",") if isinstance(context, str) else context
+    parts = sorted(p.strip().lower() for p in parts if p.strip())
+    return ",".join(parts) if parts else "[]"
+
+def agent_cache_key(artist_name, context, artwork_title=None):
+    if artwork_title:
+        scope = context if isinstance(context, str) else ",".join(context)
+        return "artist-http-cache:v1:/api/artwork:" + slug(artist_name) + ":" + scope + ":" + slug(artwork_title)
+    return "artist-http-cache:v1:/api/agent:" + slug(artist_name) + ":" + stable_context(context)
+
+#### TTLS (see ArtworkCacheFilter.ttlsForArtworkScope/ttlsForAgent), as (fresh, stale) seconds
+# The backend picks the /api/agent TTLs by the request's context parameter, which holds the scope
+# for the single-scope requests the frontend and the precompute job make
+def ttls_for(scope, artwork_title=None):
+    if artwork_title:
+        return 14 * DAY_SECS, 30 * DAY_SECS
+    s = (scope or "political-events").lower()
+    if s == "art-movements":
+        return 7 * DAY_SECS, 21 * DAY_SECS
+    if s == "artist-network":
+        return 14 * DAY_SECS, 30 * DAY_SECS
+    return 2 * DAY_SECS, 7 * DAY_SECS # political/economic default
+
+#### BODIES
+# The backend stores the last SSE message of a stream, as written by Spring's SseEmitter
+def sse_body(message_json):
+    return "data:" + message_json + "\n\n"
+
+class ResultStore:
+    def __init__(self, db_path = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._init()
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def _init(self):
+        # same schema as SqliteHttpCache.init(), so whichever side creates the database first works
+        with self._lock, self._connect() as c:
+            c.execute("PRAGMA journal_mode=WAL")
+            c.execute("PRAGMA synchronous=NORMAL")
+            c.execute("""
+              CREATE TABLE IF NOT EXISTS cache(
+                key TEXT PRIMARY KEY,
+                body TEXT NOT NULL,
+                fresh_until INTEGER NOT NULL,
+                stale_until INTEGER NOT NULL,
+                created_at INTEGER NOT NULL,
+                updated_at INTEGER NOT NULL
+              )
+            """)
+            c.execute("CREATE INDEX IF NOT EXISTS idx_cache_fresh ON cache(fresh_until)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_cache_stale ON cache(stale_until)")
+
+    # returns (body, fresh_until, stale_until) for a key that is fresh or stale, or None
+    def get(self, key):
+        now = int(time.time() * 1000)
+        with self._lock, self._connect() as c:
+            row = c.execute("SELECT body,fresh_until,stale_until FROM cache WHERE key=?", (key,)).fetchone()
+        if row and (now < row[1] or now < row[2]):
+            return row
+        return None
+
+    def is_fresh(self, key):
+        row = self.get(key)
+        return row is not None and int(time.time() * 1000) < row[1]
+
+    def put(self, key, body, fresh_secs, stale_secs):
+        now = int(time.time() * 1000)
+        fresh_until = now + fresh_secs * 1000
+        stale_until = now + (fresh_secs + stale_secs) * 1000
+        with self._lock, self._connect() as c:
+            c.execute("""
+              INSERT INTO cache(key,body,fresh_until,stale_until,created_at,updated_at)
+              VALUES(?,?,?,?,?,?)
+              ON CONFLICT(key) DO UPDATE SET
+                body=excluded.body,
+                fresh_until=excluded.fresh_until,
+                stale_until=excluded.stale_until,
+                updated_at=excluded.updated_at
+            """, (key, body, fresh_until, stale_until, now, now))
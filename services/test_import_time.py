@@ -0,0 +1,43 @@
+# Import-time budget for the services: importing them must stay fast and must not pull in the
+# heavy agent/embedding dependencies, which are only loaded once they are needed (see
+# llm_service.warm_up() and the lazy imports in vectordb_service.py)
+# Run with `python -m pytest test_import_time.py` from `services`
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+SERVICES_DIR = os.path.dirname(os.path.abspath(__file__))
+# wall-clock seconds allowed for importing both services in a fresh interpreter
+IMPORT_BUDGET_SECONDS = float(os.getenv("IMPORT_BUDGET_SECONDS", 3))
+HEAVY_MODULES = ["openai", "smolagents", "huggingface_hub", "faiss", "sentence_transformers"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import llm_service, vectordb_service
+elapsed = time.perf_counter() - start
+print(json.dumps({"seconds": elapsed, "loaded": [name for name in %r if name in sys.modules]}))
+""" % HEAVY_MODULES
+
+# local stores the services would use, pointed at a temporary directory so the real ones are
+# never touched
+STORE_ENV = {"EVENT_INDEX_DB": "event_index.db", "NETWORK_GRAPH_PATH": "network_graph.db"}
+
+def measure_import(store_dir):
+    env = dict(os.environ, OPENAI_API_KEY="test-openai-key", HF_API_TOKEN="test-hf-token",
+               **{name: os.path.join(store_dir, file_name) for name, file_name in STORE_ENV.items()})
+    completed = subprocess.run([sys.executable, "-c", IMPORT_SCRIPT], cwd=SERVICES_DIR, env=env,
+                               capture_output=True, text=True, timeout=120)
+    assert completed.returncode == 0, completed.stderr
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def test_import_time_budget():
+    with tempfile.TemporaryDirectory() as store_dir:
+        result = measure_import(store_dir)
+        # the local stores are only opened once they are used
+        assert os.listdir(store_dir) == []
+    assert result["loaded"] == [], f"heavy modules imported at import time: {result['loaded']}"
+    assert result["seconds"] < IMPORT_BUDGET_SECONDS, \
+        f"importing the services took {result['seconds']:.2f}s (budget {IMPORT_BUDGET_SECONDS}s)"
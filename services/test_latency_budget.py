@@ -0,0 +1,74 @@
+# Latency budget handling of two-prompt scopes in llm_service.query_agents, run on stand-in agents
+# so no model or search calls are made
+# Run with `python -m pytest test_latency_budget.py` from `services`
+import os
+import tempfile
+import time
+
+# keep the service's local stores out of the real ones
+temp_dir = tempfile.mkdtemp()
+os.environ.setdefault("OPENAI_API_KEY", "test-openai-key")
+os.environ.setdefault("HF_API_TOKEN", "test-hf-token")
+os.environ["EVENT_INDEX_DB"] = os.path.join(temp_dir, "event_index.db")
+os.environ["NETWORK_GRAPH_PATH"] = os.path.join(temp_dir, "network_graph.json")
+
+import llm_service
+
+class TokenCounts:
+    input_tokens = 0
+    output_tokens = 0
+
+class Monitor:
+    def get_total_token_counts(self):
+        return TokenCounts()
+
+class Memory:
+    steps = []
+
+class StubAgent:
+    def __init__(self, name, max_steps):
+        self.name = name
+        self.max_steps = max_steps
+        self.prompt_templates = {}
+        self.monitor = Monitor()
+        self.memory = Memory()
+        self.runs = [] # max_steps of every run
+
+    def run(self, task, max_steps):
+        self.runs.append(max_steps)
+        return f"{self.name} output"
+
+class StubSearchTool:
+    call_count = 0
+    deadline_hit = False
+
+    def reset(self, deadline = None, research_context = None):
+        pass
+
+def stub_agent_set():
+    return {
+        "search_tool": StubSearchTool(),
+        "agents": [StubAgent("researcher", 6), StubAgent("historian", 4)],
+        "usage": {"agent_runs": 0, "searches": 0, "input_tokens": 0, "output_tokens": 0}
+    }
+
+def query_with_exhausted_budget(scope):
+    llm_service.warm_up_state["ready"] = True # the stand-in agents need no warm-up
+    agent_set = stub_agent_set()
+    result, output_type, partial = llm_service.query_agents(scope, "<Frida Kahlo: [" + scope + "]>", "prompts",
+                                                            agent_set, deadline=time.monotonic())
+    return agent_set["agents"], result, partial
+
+def test_historian_gets_one_step_when_researcher_output_is_not_final():
+    (researcher, historian), result, partial = query_with_exhausted_budget("genre")
+    assert researcher.runs == [1]
+    assert historian.runs == [1]
+    assert result == "historian output"
+    assert partial
+
+def test_historian_is_skipped_when_researcher_output_is_final():
+    (researcher, historian), result, partial = query_with_exhausted_budget("artist-network")
+    assert researcher.runs == [1]
+    assert historian.runs == []
+    assert result == "researcher output"
+    assert partial
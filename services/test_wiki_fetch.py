@@ -0,0 +1,87 @@
+# Wikipedia fetching in vectordb_service, run against a local stub of the MediaWiki API
+# Run with `python -m pytest test_wiki_fetch.py` from `services`
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+os.environ.setdefault("OPENAI_API_KEY", "test-openai-key")
+
+import vectordb_service
+
+PAGES = {f"Article {i}": (1000 + i, f"Text of article {i}.") for i in range(120)}
+PAGES["Mona Lisa"] = (555, "The Mona Lisa is a portrait painting by Leonardo da Vinci.")
+REDIRECTS = {"La Gioconda": "Mona Lisa"}
+
+# Answers action=query requests for PAGES the way the API does with formatversion=2 and
+# redirects=1, normalizing titles by capitalizing their first letter; keeps every call's params
+class StubWikiAPI(BaseHTTPRequestHandler):
+    calls = []
+
+    def do_GET(self):
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        StubWikiAPI.calls.append(params)
+        query = {"normalized": [], "redirects": [], "pages": []}
+        for title in params["titles"].split("|"):
+            normalized = title[:1].upper() + title[1:]
+            if normalized != title:
+                query["normalized"].append({"from": title, "to": normalized})
+            target = REDIRECTS.get(normalized, normalized)
+            if target != normalized:
+                query["redirects"].append({"from": normalized, "to": target})
+            if target not in PAGES:
+                query["pages"].append({"title": target, "missing": True})
+                continue
+            revid, text = PAGES[target]
+            page = {"title": target, "revisions": [{"revid": revid}]}
+            if "extracts" in params["prop"]:
+                page["extract"] = text
+            query["pages"].append(page)
+        body = json.dumps({"query": query}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def wiki_api(monkeypatch, tmp_path):
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubWikiAPI)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(vectordb_service, "WIKI_API_URL", f"http://127.0.0.1:{server.server_port}/w/api.php")
+    monkeypatch.setattr(vectordb_service, "WIKI_CACHE_DIR", str(tmp_path))
+    StubWikiAPI.calls = []
+    yield StubWikiAPI.calls
+    server.shutdown()
+    server.server_close()
+
+def revision_calls(calls):
+    return [call for call in calls if call["prop"] == "revisions"]
+
+def extract_calls(calls):
+    return [call for call in calls if "extracts" in call["prop"]]
+
+def test_revision_lookups_are_batched(wiki_api):
+    titles = [f"Article {i}" for i in range(120)]
+    texts = vectordb_service.fetch_wikipedia_texts(titles)
+    assert texts == {title: PAGES[title][1] for title in titles}
+    assert [len(call["titles"].split("|")) for call in revision_calls(wiki_api)] == [50, 50, 20]
+
+def test_redirects_and_normalized_titles_resolve(wiki_api):
+    texts = vectordb_service.fetch_wikipedia_texts(["mona Lisa", "La Gioconda", "No such article"])
+    assert texts == {"mona Lisa": PAGES["Mona Lisa"][1], "La Gioconda": PAGES["Mona Lisa"][1], "No such article": ""}
+
+def test_unchanged_revisions_are_served_from_the_cache(wiki_api):
+    titles = ["Article 1", "Article 2", "La Gioconda"]
+    first = vectordb_service.fetch_wikipedia_texts(titles)
+    assert len(extract_calls(wiki_api)) == 3
+    wiki_api.clear()
+    assert vectordb_service.fetch_wikipedia_texts(titles) == first
+    assert extract_calls(wiki_api) == []
+    assert len(revision_calls(wiki_api)) == 1
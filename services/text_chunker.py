@@ -0,0 +1,228 @@
+# Text chunking shared by the indexing scripts (vectordb_service.py, pinecone_build.py)
+# Produces the same chunks as LangChain's RecursiveCharacterTextSplitter with its default settings
+# (separators "\n\n", "\n", " ", "", each kept at the start of the piece that follows it, and
+# chunks stripped of surrounding whitespace) without importing LangChain, and works on offsets
+# into the original text rather than copying every intermediate piece, which matters for the
+# multi-megabyte fullText bodies of the JSTOR data
+#
+# Run `python text_chunker.py [--file data/artinfo-jstor-cleaned.jsonl]` to compare its output and
+# speed against LangChain's splitter (if installed)
+import argparse
+import json
+import os
+import time
+from collections import deque
+
+SEPARATORS = ["\n\n", "\n", " ", ""]
+DEFAULT_CHUNK_SIZE = 512
+DEFAULT_OVERLAP = 50
+
+def check_sizes(chunk_size, overlap):
+    if chunk_size <= 0:
+        raise ValueError(f"chunk_size must be > 0, got {chunk_size}")
+    if overlap < 0:
+        raise ValueError(f"overlap must be >= 0, got {overlap}")
+    if overlap > chunk_size:
+        raise ValueError(f"Got a larger chunk overlap ({overlap}) than chunk size ({chunk_size}), should be smaller.")
+
+# (start, end) of text[start:end] with surrounding whitespace removed, None if nothing is left
+def strip_span(text, start, end):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return (start, end) if end > start else None
+
+# Merges consecutive pieces into chunks of at most chunk_size characters, starting each new chunk
+# with up to `overlap` characters' worth of the previous chunk's last pieces
+# `join(first, last)` turns the pieces from first to last into a chunk (None to drop it)
+class Merger:
+    def __init__(self, chunk_size, overlap, join):
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+        self.join = join
+        self.doc = deque() # (piece, length) of the pieces in the current chunk
+        self.total = 0
+
+    # adds a piece, returning the chunks it completed
+    def add(self, piece, length):
+        chunks = []
+        if self.total + length > self.chunk_size and self.doc:
+            chunk = self.join(self.doc[0][0], self.doc[-1][0])
+            if chunk is not None:
+                chunks.append(chunk)
+            while self.total > self.overlap or (self.total + length > self.chunk_size and self.total > 0):
+                self.total -= self.doc.popleft()[1]
+        self.doc.append((piece, length))
+        self.total += length
+        return chunks
+
+    # returns the last chunk (if any) and starts over
+    def finish(self):
+        chunks = []
+        if self.doc:
+            chunk = self.join(self.doc[0][0], self.doc[-1][0])
+            if chunk is not None:
+                chunks.append(chunk)
+        self.doc.clear()
+        self.total = 0
+        return chunks
+
+# first separator occurring in text[start:end] and the finer ones left after it
+def find_separator(text, start, end, separators):
+    for i, separator in enumerate(separators):
+        if not separator:
+            return separator, []
+        if text.find(separator, start, end) != -1:
+            return separator, separators[i + 1:]
+    return separators[-1], []
+
+# spans of text[start:end] split before every occurrence of the separator (or into characters)
+def split_spans(text, start, end, separator):
+    if not separator:
+        return [(i, i + 1) for i in range(start, end)]
+    spans = []
+    piece_start = start
+    position = text.find(separator, start, end)
+    while position != -1:
+        if position > piece_start:
+            spans.append((piece_start, position))
+        piece_start = position
+        position = text.find(separator, position + len(separator), end)
+    if end > piece_start:
+        spans.append((piece_start, end))
+    return spans
+
+# appends the chunk spans of text[start:end] to `out`, splitting on the first of the separators
+# found and recursing with the finer ones into pieces that are too long to merge
+def split_into(text, start, end, separators, chunk_size, overlap, out):
+    separator, finer = find_separator(text, start, end, separators)
+    merger = Merger(chunk_size, overlap, lambda first, last: strip_span(text, first[0], last[1]))
+    for piece_start, piece_end in split_spans(text, start, end, separator):
+        if piece_end - piece_start < chunk_size:
+            out.extend(merger.add((piece_start, piece_end), piece_end - piece_start))
+            continue
+        out.extend(merger.finish())
+        if finer:
+            split_into(text, piece_start, piece_end, finer, chunk_size, overlap, out)
+        else:
+            out.append((piece_start, piece_end)) # can't be split any further (kept unstripped)
+    out.extend(merger.finish())
+
+# (start, end) offsets of the chunks of a text, so text[start:end] is each chunk
+def chunk_spans(text, chunk_size = DEFAULT_CHUNK_SIZE, overlap = DEFAULT_OVERLAP):
+    check_sizes(chunk_size, overlap)
+    spans = []
+    split_into(text, 0, len(text), SEPARATORS, chunk_size, overlap, spans)
+    return spans
+
+def chunk_text(text, chunk_size = DEFAULT_CHUNK_SIZE, overlap = DEFAULT_OVERLAP):
+    """Splits text into smaller chunks"""
+    return [text[start:end] for start, end in chunk_spans(text, chunk_size, overlap)]
+
+# Chunks a text given as an iterable of consecutive parts (e.g. read from a stream), yielding the
+# same chunks as chunk_text() on the whole text as soon as they are complete
+# Which separator the text is split on first depends on whether it contains a paragraph break at
+# all, so the parts are buffered until the first "\n\n" turns up (or the text ends)
+def iter_chunks(parts, chunk_size = DEFAULT_CHUNK_SIZE, overlap = DEFAULT_OVERLAP):
+    check_sizes(chunk_size, overlap)
+    parts = iter(parts)
+    head = []
+    found = False
+    for part in parts:
+        if not part:
+            continue
+        found = "\n\n" in part or (head and head[-1].endswith("\n") and part.startswith("\n"))
+        head.append(part)
+        if found:
+            break
+    if not found:
+        yield from chunk_text("".join(head), chunk_size, overlap)
+        return
+
+    separator, finer = SEPARATORS[0], SEPARATORS[1:]
+    buffer = "".join(head)
+    base = 0        # offset in the whole text of buffer[0]
+    piece_start = 0 # offset in the whole text of the current (unfinished) piece
+    search_from = 0
+    merger = Merger(chunk_size, overlap, lambda first, last: buffer[first[0] - base:last[1] - base].strip() or None)
+
+    def finish_piece(start, end):
+        if end - start < chunk_size:
+            yield from merger.add((start, end), end - start)
+            return
+        yield from merger.finish()
+        piece = buffer[start - base:end - base]
+        spans = []
+        split_into(piece, 0, len(piece), finer, chunk_size, overlap, spans)
+        for span_start, span_end in spans:
+            yield piece[span_start:span_end]
+
+    while True:
+        position = buffer.find(separator, search_from - base)
+        while position != -1:
+            if base + position > piece_start:
+                yield from finish_piece(piece_start, base + position)
+            piece_start = base + position
+            search_from = piece_start + len(separator)
+            position = buffer.find(separator, search_from - base)
+        # drop the part of the buffer no longer needed by the current chunk or piece
+        keep_from = min(merger.doc[0][0][0], piece_start) if merger.doc else piece_start
+        if keep_from - base > len(buffer) // 2:
+            buffer = buffer[keep_from - base:]
+            base = keep_from
+        part = next(parts, None)
+        if part is None:
+            break
+        buffer += part
+    if base + len(buffer) > piece_start:
+        yield from finish_piece(piece_start, base + len(buffer))
+    yield from merger.finish()
+
+#### BENCHMARK
+def load_sample(path, max_docs):
+    texts = []
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        for line in f:
+            data = json.loads(line)
+            if data.get("fullText"):
+                texts.append(data["fullText"][0])
+            if len(texts) == max_docs:
+                break
+    return texts
+
+def timed(function, texts):
+    start = time.perf_counter()
+    chunks = [function(text) for text in texts]
+    return chunks, time.perf_counter() - start
+
+def in_parts(text, size = 65536):
+    return (text[i:i + size] for i in range(0, len(text), size))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare this chunker with LangChain's RecursiveCharacterTextSplitter.")
+    parser.add_argument("--file", default=os.path.join("data", "artinfo-jstor-cleaned.jsonl"), help="JSTOR JSONL sample with fullText fields")
+    parser.add_argument("--docs", type=int, default=50, help="number of documents to chunk")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument("--overlap", type=int, default=DEFAULT_OVERLAP)
+    args = parser.parse_args()
+
+    texts = load_sample(args.file, args.docs)
+    print(f"{len(texts)} documents, {sum(len(text) for text in texts) / 1e6:.1f}M characters")
+
+    ours, ours_secs = timed(lambda text: chunk_text(text, args.chunk_size, args.overlap), texts)
+    streamed, streamed_secs = timed(lambda text: list(iter_chunks(in_parts(text), args.chunk_size, args.overlap)), texts)
+    print(f"text_chunker.chunk_text:  {ours_secs:.3f}s, {sum(len(chunks) for chunks in ours)} chunks")
+    print(f"text_chunker.iter_chunks: {streamed_secs:.3f}s, {'same' if streamed == ours else 'DIFFERENT'} chunks")
+
+    try:
+        start = time.perf_counter()
+        from langchain_text_splitters import RecursiveCharacterTextSplitter
+        import_secs = time.perf_counter() - start
+    except ImportError:
+        print("langchain_text_splitters not installed, skipping the comparison")
+    else:
+        splitter = RecursiveCharacterTextSplitter(chunk_size=args.chunk_size, chunk_overlap=args.overlap)
+        theirs, theirs_secs = timed(splitter.split_text, texts)
+        print(f"LangChain split_text:     {theirs_secs:.3f}s (+{import_secs:.3f}s import), {'same' if theirs == ours else 'DIFFERENT'} chunks")
+        print(f"Speedup: {theirs_secs / ours_secs:.1f}x")
@@ -1,14 +1,21 @@
 from fastapi import FastAPI, HTTPException
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from typing import List
-import faiss
 import numpy as np
 import requests
-from sentence_transformers import SentenceTransformer
-from langchain.text_splitter import RecursiveCharacterTextSplitter
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from dotenv import load_dotenv
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import glob
 import os
-import openai
+import threading
+from text_chunker import chunk_text
+
+# NOTE: faiss and openai are imported lazily (in get_index() and get_client()) so that
+# importing this module, and the "/" liveness check, stay fast
 
 # Initialize FastAPI app
 app = FastAPI()
@@ -18,15 +25,23 @@ load_dotenv()
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
     raise ValueError("Missing OpenAI API Key. Set OPENAI_API_KEY as an environment variable or in a .env file.")
-client = openai.OpenAI(api_key=OPENAI_API_KEY)
+client = None  # created on first use by get_client()
 
-# Initialize FAISS index
+# FAISS index, created on first use by get_index()
 embedding_size = 384  # Model output size
-index = faiss.IndexFlatL2(embedding_size)  # L2 distance search
+index = None
 doc_store = {}  # Stores chunk mappings (index -> text)
+init_lock = threading.Lock()
 
-# Wikipedia API URL
-WIKI_API_URL = "https://en.wikipedia.org/w/api.php"
+# Wikipedia API URL (can be pointed at a local stub of the API for testing)
+WIKI_API_URL = os.getenv("WIKI_API_URL", "https://en.wikipedia.org/w/api.php")
+# Fetched articles are cached on disk by title and revision, so re-indexing an unchanged article
+# only costs the (batched) revision lookup
+WIKI_CACHE_DIR = os.getenv("WIKI_CACHE_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "wiki_cache"))
+WIKI_MAX_CONCURRENCY = int(os.getenv("WIKI_MAX_CONCURRENCY", 4))
+WIKI_TIMEOUT = (5, 30)  # (connect, read) seconds
+WIKI_BATCH_SIZE = 50  # maximum number of titles per query accepted by the API
+wiki_session = None  # created on first use by get_wiki_session()
 
 class IndexRequest(BaseModel):
     article_titles: List[str]
@@ -35,31 +50,158 @@ class QueryRequest(BaseModel):
     query: str
     top_k: int = 3
 
+def get_client():
+    """Returns the OpenAI client, creating it on first use"""
+    global client
+    with init_lock:
+        if client is None:
+            import openai
+            client = openai.OpenAI(api_key=OPENAI_API_KEY)
+    return client
+
+def get_index():
+    """Returns the FAISS index, creating it on first use"""
+    global index
+    with init_lock:
+        if index is None:
+            import faiss
+            index = faiss.IndexFlatL2(embedding_size)  # L2 distance search
+    return index
+
+def warm_up():
+    """Loads the lazily-imported dependencies ahead of the first request"""
+    get_client()
+    get_index()
+
+def get_wiki_session():
+    """Returns the pooled HTTP session used for Wikipedia API calls, creating it on first use"""
+    global wiki_session
+    with init_lock:
+        if wiki_session is None:
+            session = requests.Session()
+            retries = Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504])
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=WIKI_MAX_CONCURRENCY, max_retries=retries)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            session.headers["User-Agent"] = "Art-in-context vectordb_service"
+            wiki_session = session
+    return wiki_session
+
+def wiki_query(params):
+    """Runs a MediaWiki API query and returns the "query" part of the response"""
+    params = {"action": "query", "format": "json", "formatversion": 2, "redirects": 1, **params}
+    response = get_wiki_session().get(WIKI_API_URL, params=params, timeout=WIKI_TIMEOUT)
+    response.raise_for_status()
+    return response.json().get("query", {})
+
+def resolve_titles(query, titles):
+    """Maps each requested title to the page title it ends up at after normalization and redirects"""
+    renamed = {}
+    for key in ("normalized", "redirects"):
+        for entry in query.get(key, []):
+            renamed[entry["from"]] = entry["to"]
+    resolved = {}
+    for title in titles:
+        target = title
+        while target in renamed and renamed[target] != target:
+            target = renamed[target]
+        resolved[title] = target
+    return resolved
+
+def fetch_revisions(titles):
+    """Looks up the latest revision id of each title, WIKI_BATCH_SIZE titles per call
+    Returns {title: (page title, revision id)}, leaving out titles with no such page"""
+    revisions = {}
+    for start in range(0, len(titles), WIKI_BATCH_SIZE):
+        batch = titles[start:start + WIKI_BATCH_SIZE]
+        query = wiki_query({"prop": "revisions", "rvprop": "ids", "titles": "|".join(batch)})
+        pages = {page["title"]: page for page in query.get("pages", [])}
+        for title, page_title in resolve_titles(query, batch).items():
+            page = pages.get(page_title)
+            if page and not page.get("missing") and page.get("revisions"):
+                revisions[title] = (page_title, page["revisions"][0]["revid"])
+    return revisions
+
+def fetch_extract(title):
+    """Fetches the plain text of an article along with its revision id, as (text, revision id)
+    The API only returns whole-article extracts for one page per call, so these can't be batched"""
+    query = wiki_query({"prop": "extracts|revisions", "explaintext": 1, "rvprop": "ids", "titles": title})
+    for page in query.get("pages", []):
+        if page.get("missing"):
+            break
+        revid = page["revisions"][0]["revid"] if page.get("revisions") else None
+        return page.get("extract", ""), revid
+    return "", None
+
+def cache_path(page_title, revid):
+    return os.path.join(WIKI_CACHE_DIR, hashlib.sha1(page_title.encode("utf-8")).hexdigest()[:16] + f"-{revid}.txt")
+
+def read_cached(page_title, revid):
+    try:
+        with open(cache_path(page_title, revid), "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+def write_cached(page_title, revid, text):
+    """Caches an article's text for a revision, replacing the cached text of older revisions"""
+    path = cache_path(page_title, revid)
+    try:
+        os.makedirs(WIKI_CACHE_DIR, exist_ok=True)
+        for old_path in glob.glob(path.rsplit("-", 1)[0] + "-*.txt"):
+            if old_path != path:
+                os.remove(old_path)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Warning: could not cache Wikipedia article {page_title} ({e})")
+
+def fetch_wikipedia_texts(titles):
+    """Fetches the text of many Wikipedia articles, returning {title: text} ("" if not found)
+    Revision ids are looked up in batches; articles not cached for their latest revision are then
+    fetched in parallel, at most WIKI_MAX_CONCURRENCY at a time"""
+    titles = list(dict.fromkeys(titles))
+    try:
+        revisions = fetch_revisions(titles)
+    except (requests.RequestException, ValueError) as e:
+        print(f"Warning: Wikipedia revision lookup failed ({e}), fetching articles without the cache")
+        revisions = {title: (title, None) for title in titles}
+
+    texts = {title: "" for title in titles}
+    to_fetch = []
+    for title, (page_title, revid) in revisions.items():
+        cached = read_cached(page_title, revid) if revid is not None else None
+        if cached is None:
+            to_fetch.append(title)
+        else:
+            texts[title] = cached
+
+    def fetch(title):
+        try:
+            text, revid = fetch_extract(revisions[title][0])
+        except (requests.RequestException, ValueError) as e:
+            print(f"Warning: could not fetch Wikipedia article {title} ({e})")
+            return title, ""
+        if revid is not None:
+            write_cached(revisions[title][0], revid, text)
+        return title, text
+
+    if to_fetch:
+        with ThreadPoolExecutor(max_workers=min(WIKI_MAX_CONCURRENCY, len(to_fetch))) as executor:
+            for title, text in executor.map(fetch, to_fetch):
+                texts[title] = text
+    print(f"Fetched {len(titles)} Wikipedia articles ({len(revisions) - len(to_fetch)} cached, {len(to_fetch)} downloaded)")
+    return texts
+
 def fetch_wikipedia_text(title):
     """Fetches Wikipedia article text by title"""
-    params = {
-        "action": "query",
-        "format": "json",
-        "prop": "extracts",
-        "explaintext": True,
-        "titles": title
-    }
-    response = requests.get(WIKI_API_URL, params=params).json()
-    
-    pages = response.get("query", {}).get("pages", {})
-    for page in pages.values():
-        return page.get("extract", "")
-    
-    return ""
-
-def chunk_text(text, chunk_size=512, overlap=50):
-    """Splits text into smaller chunks"""
-    splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=overlap)
-    return splitter.split_text(text)
+    return fetch_wikipedia_texts([title])[title]
 
 def get_embedding(text):
     """Converts text into vector embedding"""
-    response = client.embeddings.create(
+    response = get_client().embeddings.create(
         model="text-embedding-3-small",
         input=text,
         dimensions=384
@@ -68,15 +210,16 @@ def get_embedding(text):
 
 def index_articles(article_titles):
     """Fetches, chunks, and indexes Wikipedia articles"""
-    global doc_store, index
+    global doc_store
 
+    index = get_index()
     all_embeddings = []
     doc_store.clear()  # Reset stored chunks
+    texts = fetch_wikipedia_texts(article_titles)
     
     for title in article_titles:
         print(title)
-        text = fetch_wikipedia_text(title)
-        print("fetched wikipedia article from title")
+        text = texts[title]
         if not text:
             continue
         
@@ -94,6 +237,23 @@ def index_articles(article_titles):
         index.reset()  # Clear FAISS index
         index.add(np.array(all_embeddings, dtype=np.float32))
 
+# Start loading faiss/openai in the background as soon as the server starts
+@app.on_event("startup")
+def start_warm_up():
+    threading.Thread(target=warm_up, name="vectordb-warm-up", daemon=True).start()
+
+@app.api_route("/", methods=["GET", "HEAD"])
+def root():
+    """Liveness check - responds as soon as the app is up"""
+    return {"status": "ok", "service": "vectordb_service"}
+
+@app.api_route("/ready", methods=["GET", "HEAD"])
+def ready():
+    """Readiness check - only reports ready once faiss and the OpenAI client are loaded"""
+    if client is None or index is None:
+        return JSONResponse(status_code=503, content={"status": "warming_up", "service": "vectordb_service"})
+    return {"status": "ready", "service": "vectordb_service"}
+
 @app.post("/index")
 def index_articles_api(request: IndexRequest):
     print("/index")
@@ -109,6 +269,6 @@ def search_faiss(request: QueryRequest):
         raise HTTPException(status_code=400, detail="No articles indexed. Call /index first.")
     
     query_embedding = np.array([get_embedding(request.query)], dtype=np.float32)
-    distances, indices = index.search(query_embedding, request.top_k)
+    distances, indices = get_index().search(query_embedding, request.top_k)
 
     return {"results": results}